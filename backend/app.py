@@ -1,63 +1,87 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+import bisect
 import hashlib
+import ipaddress
 import numpy as np
 from flask_cors import CORS
 import json
-import requests
+import multiprocessing
+import os
+import threading
+import time
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from functools import lru_cache
+from noise_backends import NOISE_BACKENDS, resolve_noise_backend
+from chunk_cache import ChunkCache
+from chunk_store import ChunkStore
+from mineral_tables import MineralTables, StaleTablesError, layers_map, load_mineral_tables
+import chunk_codec
+from image_codec import encode_indexed_png
+from surface import exposed_voxels, greedy_quads
+from plate_index import PlateIndex
+from snapshot import load_snapshot
+from geo_cache import GeoCache, bbox_key, coord_key, location_key
+from mined_store import MinedStore, chunk_key as mined_chunk_key, decode_index_set, encode_index_set
+from worker_pool import GEN_WORKERS, SharedArrays, get_pool, retire_pool, split_range
+from upstream import CircuitOpenError, RateLimitedError, UpstreamClient
 app = Flask(__name__)
 CORS(app)
 HEADERS = {'User-Agent': 'LithosExplorer/1.0 (+https://github.com/your-repo/lithos-explorer)'}
-# Load minerals.json
-with open('minerals.json', 'r') as f:
-    minerals_data = json.load(f)
-# Build MINERAL_COLORS from JSON
-MINERAL_COLORS = {
-    'void': (255, 255, 255), # White (porosity)
-    'cover': (165, 42, 42) # Brown for mining cover (fallback, not in JSON)
-}
-for name, data in minerals_data['minerals'].items():
-    MINERAL_COLORS[name] = tuple(data['color'])
-# Build DEPTH_LAYERS from JSON prob_layers
-layers_map = {
-    "0-10": (0, 10),
-    "11-35": (11, 35),
-    "36-inf": (36, float('inf'))
-}
-DEPTH_LAYERS = {}
-for layer_key, layer_range in layers_map.items():
-    probs = {}
-    for name, data in minerals_data['minerals'].items():
-        prob = data.get('prob_layers', {}).get(layer_key, 0.0)
-        if prob > 0:
-            probs[name] = prob
-    # Add void probabilities (fixed, as they are not in JSON)
-    probs['void'] = 0.1 if layer_range[0] < 36 else 0.05
-    DEPTH_LAYERS[layer_range] = probs
+# Pooled, rate-limited, circuit-broken HTTP client shared by every upstream call
+UPSTREAM = UpstreamClient()
+# Upstream geology lookups persisted across requests and restarts
+GEO_CACHE = GeoCache(os.environ.get('LITHOS_GEO_CACHE_PATH', 'geo_cache.sqlite3'))
+ADMIN_TOKEN = os.environ.get('LITHOS_ADMIN_TOKEN', '') # If set, admin endpoints require a matching X-Admin-Token header; if not, loopback clients only
+# Generated chunks (uint8 id arrays) kept in memory, bounded by total bytes
+CHUNK_CACHE = ChunkCache(int(os.environ.get('LITHOS_CHUNK_CACHE_BYTES', 128 * 1024 * 1024)))
+# Pre-generated chunks on disk, memory-mapped (filled by scripts/populate_chunk_store.py; empty unless populated)
+CHUNK_STORE = ChunkStore(os.environ.get('LITHOS_CHUNK_STORE_PATH', 'chunk_store'))
+# Encoded /api/slice.png bodies (stored as uint8 arrays)
+SLICE_CACHE = ChunkCache(int(os.environ.get('LITHOS_SLICE_CACHE_BYTES', 32 * 1024 * 1024)))
+SLICE_MAX_SIZE = 4096
+# Per-chunk mined-voxel edit log (see mined_store.py)
+MINED_STORE = MinedStore(os.environ.get('LITHOS_MINED_STORE_PATH', 'mined.sqlite3'))
+SECTION_MAX_POINTS = 4 * 1024 * 1024 # Samples per /api/section or /api/borehole request
+# Everything derived from minerals.json is one MineralTables snapshot; the module-level names below are rebound together
+# by install_mineral_tables, and each ProbabilityModel keeps the snapshot it was compiled from
+MINERALS_PATH = 'minerals.json'
+CATALOG_IMMUTABLE_AGE = 365 * 24 * 60 * 60 # For catalog URLs pinned to a version with ?v=
+TABLES_LOCK = threading.Lock()
+def install_mineral_tables(tables):
+    global TABLES, minerals_data, MINERAL_COLORS, DEPTH_LAYERS, MINERAL_NAMES, MINERAL_IDS, MINERAL_NAMES_ARRAY
+    global MINERAL_PALETTE, PAD_COLOR_ID, CATALOG, COVER_RULES
+    TABLES = tables
+    minerals_data = tables.minerals_data
+    MINERAL_COLORS = tables.colors
+    DEPTH_LAYERS = tables.depth_layers
+    MINERAL_NAMES = tables.names
+    MINERAL_IDS = tables.ids
+    MINERAL_NAMES_ARRAY = tables.names_array
+    MINERAL_PALETTE = tables.palette
+    PAD_COLOR_ID = tables.pad_color_id
+    CATALOG = tables.catalog # Lean render projection and lazily built detail projections for the frontend
+    COVER_RULES = tables.cover_rules # coverVariants conditions compiled into a rule table
+install_mineral_tables(load_mineral_tables(MINERALS_PATH))
+# Prebuilt plate index from scripts/build_snapshot.py (optional; the plates file is used without it)
+SNAPSHOT_PATH = os.environ.get('LITHOS_SNAPSHOT_PATH', 'snapshot.npz')
+SNAPSHOT = load_snapshot(SNAPSHOT_PATH)
+CATALOG_STATE = {'mtime': os.stat(MINERALS_PATH).st_mtime_ns, 'loaded_at': time.time(), 'last_error': None}
+CATALOG_WATCH_INTERVAL = float(os.environ.get('LITHOS_CATALOG_WATCH_INTERVAL', 2)) # Seconds between mtime polls; 0 disables hot reload
 # Tectonic plates cache
+PLATES_PATH = 'tectonic_plates.json'
 PLATES_GEOJSON = None
 def load_tectonic_plates():
     global PLATES_GEOJSON
     if PLATES_GEOJSON is not None:
         return PLATES_GEOJSON
+    # Never fetched over the network here: scripts/build_snapshot.py --download-plates fetches the file ahead of time
     try:
-        with open('tectonic_plates.json', 'r') as f:
+        with open(PLATES_PATH, 'r') as f:
             PLATES_GEOJSON = json.load(f)
         print("Tectonic plates loaded from local file")
     except FileNotFoundError:
-        print("Local tectonic_plates.json not found, falling back to URL")
-        try:
-            url = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_plates.json"
-            resp = requests.get(url, timeout=15)
-            if resp.ok:
-                PLATES_GEOJSON = resp.json()
-                print("Tectonic plates loaded successfully from URL")
-            else:
-                PLATES_GEOJSON = None
-        except Exception as e:
-            print(f"Failed to load tectonic plates from URL: {e}")
-            PLATES_GEOJSON = None
+        print("Local tectonic_plates.json not found; plate lookups are disabled (run scripts/build_snapshot.py --download-plates)")
     return PLATES_GEOJSON
 def point_in_polygon(x, y, poly):
     n = len(poly)
@@ -74,7 +98,32 @@ def point_in_polygon(x, y, poly):
                         inside = not inside
         p1x, p1y = p2x, p2y
     return inside
+# Plate lookup index, built once after the plates load (or read from the snapshot)
+PLATE_INDEX = None
+PLATE_INDEX_LOCK = threading.Lock()
+PLATE_RASTER_RES = float(os.environ.get('LITHOS_PLATE_RASTER_RES', 0)) # Degrees; 0 disables the O(1) raster fast path
+def get_plate_index():
+    global PLATE_INDEX
+    if PLATE_INDEX is None:
+        with PLATE_INDEX_LOCK:
+            if PLATE_INDEX is None:
+                index = SNAPSHOT.plate_index(PLATES_PATH, PLATE_RASTER_RES) if SNAPSHOT is not None else None
+                if index is None:
+                    plates = load_tectonic_plates()
+                    if not plates:
+                        return None
+                    index = PlateIndex(plates)
+                if PLATE_RASTER_RES > 0 and index.raster is None:
+                    index.build_raster(PLATE_RASTER_RES)
+                PLATE_INDEX = index
+    return PLATE_INDEX
 def get_plate_type(lat, lon):
+    index = get_plate_index()
+    if index is None:
+        return None
+    return index.lookup(lat, lon)
+def get_plate_type_linear(lat, lon):
+    """Reference linear scan over every plate polygon (what PlateIndex.lookup reproduces)"""
     plates = load_tectonic_plates()
     if not plates:
         return None
@@ -91,204 +140,708 @@ def get_plate_type(lat, lon):
             if point_in_polygon(lon, lat, poly):
                 return plate_name
     return None
-@lru_cache(maxsize=100000)
-def get_mineral_type_no_bias(seed: str, x: int, y: int, z: int, prob_offsets_tuple: tuple = (), allowed_minerals_tuple: tuple = ()):
-    """Determine mineral at (x,y,z) using seeded SHA-256 hash, without vein bias"""
-    prob_offsets = dict(prob_offsets_tuple)
-    allowed_minerals = list(allowed_minerals_tuple)
-    input_str = f"{seed}:{x}:{y}:{z}"
-    hash_digest = hashlib.sha256(input_str.encode()).digest()
-    hash_int = int.from_bytes(hash_digest[-8:], 'big')
-    normalized = hash_int / (2 ** 64)
-    # Find depth layer
-    layer_probs = None
-    layer_key = None # Added for layer-specific boosts
-    for lk, (min_z, max_z) in layers_map.items(): # Use layers_map for key lookup
-        if min_z <= z < max_z:
-            layer_key = lk
-            layer_probs = DEPTH_LAYERS[(min_z, max_z)].copy()
-            break
+class ProbabilityModel:
+    """
+    Probability tables for one (prob_offsets, allowed_minerals) pair, compiled once from DEPTH_LAYERS.
+    For each depth layer it holds the sorted mineral ids with their cumulative thresholds (no-bias sampling)
+    and the weights and boost ladders used by the vein-bias pass. Use compile_probability_model to get one.
+    """
+    use_related_boosts = False # Optional cluster boosts using 'related_minerals' (toggle here for dev); default False for realism priority
+    def __init__(self, prob_offsets_tuple: tuple = (), allowed_minerals_tuple: tuple = (), mineral_tables=None):
+        self.prob_offsets_tuple = prob_offsets_tuple
+        self.allowed_minerals_tuple = allowed_minerals_tuple
+        self.mineral_tables = mineral_tables or TABLES # Palette and tables stay consistent across a hot reload
+        self.generation = self.mineral_tables.generation
+        self.id_generation = self.mineral_tables.id_generation # Colour or cover edits keep it, and with it the fingerprint
+        self.tables = {} # layer_key -> (thresholds, ids), or None when the layer is all void
+        self.vein_tables = {} # layer_key -> (weights, ladders, sorted_names, sorted_ids)
+        for layer_key in layers_map:
+            self.tables[layer_key] = self._compile_table(layer_key)
+            self.vein_tables[layer_key] = self._compile_vein_table(layer_key)
+        digest = hashlib.sha256(self.id_generation.encode())
+        for layer_key in layers_map:
+            table = self.tables[layer_key]
+            if table is not None:
+                digest.update(table[0].tobytes() + table[1].tobytes())
+            weights, ladders, _, _ = self.vein_tables[layer_key]
+            digest.update(repr((layer_key, sorted(weights.items()), sorted((m, l[1].tolist()) for m, l in ladders.items()))).encode())
+        self.fingerprint = digest.hexdigest()[:16] # Identifies the voxel ids the model produces, e.g. for cache and store keys
+    def _layer_probs(self, layer_key):
+        layer_probs = self.mineral_tables.depth_layers[layers_map[layer_key]].copy()
+        # Apply location-based offsets
+        for mineral, offset in self.prob_offsets_tuple:
+            if mineral in layer_probs:
+                layer_probs[mineral] = max(0, layer_probs[mineral] + offset)
+        return layer_probs
+    def _filter_allowed(self, layer_probs):
+        if self.allowed_minerals_tuple:
+            return {k: v for k, v in layer_probs.items() if k in self.allowed_minerals_tuple}
+        return layer_probs
+    def _compile_table(self, layer_key):
+        layer_probs = self._layer_probs(layer_key)
+        if self.use_related_boosts:
+            associated_boost = 0.03 # Lowered for balance
+            for mineral, offset in self.prob_offsets_tuple:
+                if offset > 0 and mineral in self.mineral_tables.minerals_data['minerals']:
+                    related = self.mineral_tables.minerals_data['minerals'][mineral].get('related_minerals', [])
+                    if not isinstance(related, list): # Safeguard if malformed
+                        continue
+                    boost_scale = 2.0 if layer_key == "36-inf" else 1.0 # Stronger in deep layers
+                    for rel in related:
+                        rel_lower = rel.lower()
+                        for min_key in list(layer_probs.keys()): # Only boost if in layer_probs
+                            if min_key.lower() == rel_lower or rel_lower in min_key.lower():
+                                layer_probs[min_key] = max(0, layer_probs[min_key] + associated_boost * boost_scale)
+        layer_probs = self._filter_allowed(layer_probs)
+        total = sum(layer_probs.values())
+        if total <= 0:
+            return None
+        # Renormalize after boosts (minor tweak for balance)
+        for mineral in layer_probs:
+            layer_probs[mineral] /= total
+        total = sum(layer_probs.values()) # Should be ~1 now
+        # Build cumulative distribution
+        cum = 0.0
+        thresholds = []
+        ids = []
+        for mineral in sorted(layer_probs.keys()):
+            cum += layer_probs[mineral] / total
+            thresholds.append(cum)
+            ids.append(self.mineral_tables.ids[mineral])
+        return np.array(thresholds, dtype=np.float64), np.array(ids, dtype=np.uint8)
+    def _compile_vein_table(self, layer_key):
+        # The vein-bias pass skips the renormalization; weights keep DEPTH_LAYERS order for summing
+        layer_probs = self._filter_allowed(self._layer_probs(layer_key))
+        # Weight after 0..6 same-mineral neighbours, adding one boost at a time so floats match the per-voxel loop
+        ladders = {}
+        for mineral, prob in layer_probs.items():
+            boost = (self.mineral_tables.minerals_data['minerals'].get(mineral, {}).get('vein_boost_layers') or {}).get(layer_key)
+            if boost is not None and boost > 0:
+                ladder = [prob]
+                for _ in range(6):
+                    ladder.append(ladder[-1] + boost)
+                ladders[mineral] = (self.mineral_tables.ids[mineral], np.array(ladder, dtype=np.float64))
+        sorted_names = sorted(layer_probs.keys())
+        sorted_ids = np.array([self.mineral_tables.ids[m] for m in sorted_names], dtype=np.uint8)
+        return layer_probs, ladders, sorted_names, sorted_ids
+    def layer_distribution(self, layer_key):
+        """Probability of each palette id in a layer under no-bias sampling (all void for an empty layer)"""
+        probs = np.zeros(len(self.mineral_tables.names), dtype=np.float64)
+        table = self.tables[layer_key]
+        if table is None:
+            probs[0] = 1.0
+            return probs
+        thresholds, ids = table
+        steps = np.diff(thresholds, prepend=0.0)
+        steps[-1] = 1.0 - (thresholds[-2] if len(thresholds) > 1 else 0.0) # The last mineral also takes u past the final threshold
+        np.add.at(probs, ids, steps)
+        return probs
+    @staticmethod
+    def layer_key(z):
+        for layer_key, (min_z, max_z) in layers_map.items():
+            if min_z <= z < max_z:
+                return layer_key
+        return None
+    def sample(self, z, u):
+        """Mineral name for one voxel at depth z with uniform u, O(log k) in the layer's mineral count"""
+        layer_key = self.layer_key(z)
+        table = self.tables[layer_key] if layer_key else None
+        if table is None:
+            return 'void'
+        thresholds, ids = table
+        # First threshold strictly above u, with the last mineral as fallback
+        pick = min(bisect.bisect_right(thresholds, u), len(ids) - 1)
+        return self.mineral_tables.names[ids[pick]]
+    def classify(self, u, gz):
+        """Palette ids for uniforms u whose global depth is gz (broadcastable to u), one searchsorted per layer"""
+        ids = np.zeros(u.shape, dtype=np.uint8) # Voxels outside every layer stay void
+        gz = np.broadcast_to(gz, u.shape)
+        for layer_key, (min_z, max_z) in layers_map.items():
+            table = self.tables[layer_key]
+            if table is None:
+                continue
+            mask = (gz >= min_z) & (gz < max_z)
+            if not mask.any():
+                continue
+            thresholds, layer_ids = table
+            picks = np.searchsorted(thresholds, u[mask], side='right')
+            ids[mask] = layer_ids[np.minimum(picks, len(layer_ids) - 1)]
+        return ids
+@lru_cache(maxsize=256)
+def compile_model_for_tables(mineral_tables, prob_offsets_tuple, allowed_minerals_tuple):
+    # The tables are part of the key, so a compile racing a reload can't file an old-tables model under the new ones
+    return ProbabilityModel(prob_offsets_tuple, allowed_minerals_tuple, mineral_tables)
+def compile_probability_model(prob_offsets_tuple: tuple = (), allowed_minerals_tuple: tuple = ()):
+    """Memoized ProbabilityModel for hashable (sorted) offsets and allowed minerals, on the current tables"""
+    return compile_model_for_tables(TABLES, prob_offsets_tuple, allowed_minerals_tuple)
+def cache_generated(cache, key, ids, current_generation):
+    """cache.put(key, ids), unless the key's generation (its last element) was replaced by a reload meanwhile (nothing would ever hit the entry)"""
+    if key[-1] != current_generation:
+        ids.flags.writeable = False
+        return ids
+    return cache.put(key, ids)
+def probability_model(prob_offsets=None, allowed_minerals=None):
+    """ProbabilityModel for request-style dict/list arguments"""
+    prob_offsets_tuple = tuple(sorted((prob_offsets or {}).items()))
+    allowed_minerals_tuple = tuple(sorted(allowed_minerals or []))
+    return compile_probability_model(prob_offsets_tuple, allowed_minerals_tuple)
+def get_mineral_type_no_bias(seed: str, x: int, y: int, z: int, prob_offsets_tuple: tuple = (), allowed_minerals_tuple: tuple = (), noise: str = 'sha256'):
+    """Determine mineral at (x,y,z) using the seeded noise backend (SHA-256 by default), without vein bias"""
+    model = compile_probability_model(prob_offsets_tuple, allowed_minerals_tuple)
+    return model.sample(z, NOISE_BACKENDS[noise][0](seed, x, y, z))
+def hash_uniforms(seed, xs, ys, zs, noise='sha256'):
+    """Seeded uniforms in [0, 1) for flat coordinate arrays (same values as get_mineral_type_no_bias)"""
+    return NOISE_BACKENDS[noise][1](seed, xs, ys, zs)
+def chunk_coordinates(size, x_offset=0, y_offset=0, z_offset=0):
+    """Global coordinate grids for a size^3 chunk (or an (nx, ny, nz) box), indexed [x][y][z]"""
+    nx, ny, nz = size if isinstance(size, tuple) else (size, size, size)
+    return np.meshgrid(
+        np.arange(nx, dtype=np.int64) + x_offset,
+        np.arange(ny, dtype=np.int64) + y_offset,
+        np.arange(nz, dtype=np.int64) + z_offset,
+        indexing='ij'
+    )
+# Vein-bias relaxation settings
+VEIN_BIAS_ITERATIONS = 5 # Upper bound; the pass stops early once nothing changes
+NO_NEIGHBOUR = 255 # Id for out-of-chunk neighbours, never matches a mineral
+def select_vein_biased(table, u, neighbour_ids):
+    """Palette ids for voxels with uniforms u and (6, n) neighbour ids under one layer's vein boosts"""
+    layer_probs, ladders, sorted_names, sorted_ids = table
     if not layer_probs:
-        return 'void'
-    # Apply location-based offsets
-    for mineral, offset in prob_offsets.items():
-        if mineral in layer_probs:
-            layer_probs[mineral] = max(0, layer_probs[mineral] + offset)
-    # Optional cluster boosts using 'related_minerals' (toggle here for dev)
-    if False: # Set to True to enable; default False for realism priority
-        associated_boost = 0.03 # Lowered for balance
-        mineral_keys = list(minerals_data['minerals'].keys())
-        for mineral, offset in list(prob_offsets.items()):
-            if offset > 0 and mineral in minerals_data['minerals']:
-                related = minerals_data['minerals'][mineral].get('related_minerals', [])
-                if not isinstance(related, list): # Safeguard if malformed
-                    continue
-                boost_scale = 2.0 if layer_key == "36-inf" else 1.0 # Stronger in deep layers
-                for rel in related:
-                    rel_lower = rel.lower()
-                    for min_key in list(layer_probs.keys()): # Only boost if in layer_probs
-                        if min_key.lower() == rel_lower or rel_lower in min_key.lower():
-                            layer_probs[min_key] = max(0, layer_probs[min_key] + associated_boost * boost_scale)
-    # Filter if restricted
-    if allowed_minerals:
-        layer_probs = {k: v for k, v in layer_probs.items() if k in allowed_minerals}
-    total = sum(layer_probs.values())
-    if total <= 0:
-        return 'void'
-    # Renormalize after boosts (minor tweak for balance)
+        return np.zeros(u.shape, dtype=np.uint8)
+    weights = {}
+    for mineral, prob in layer_probs.items():
+        if mineral in ladders:
+            mineral_id, ladder = ladders[mineral]
+            weights[mineral] = ladder[(neighbour_ids == mineral_id).sum(axis=0)]
+        else:
+            weights[mineral] = prob
+    # Sum in dict order, then accumulate in sorted order, exactly like the scalar selection
+    total = 0
     for mineral in layer_probs:
-        layer_probs[mineral] /= total
-    total = sum(layer_probs.values()) # Should be ~1 now
-    # Build cumulative distribution
+        total = total + weights[mineral]
+    total = np.broadcast_to(np.asarray(total, dtype=np.float64), u.shape)
+    picks = np.zeros(u.shape, dtype=np.intp)
     cum = 0.0
-    cumulative = []
-    for mineral in sorted(layer_probs.keys()):
-        prob = layer_probs[mineral] / total
-        cum += prob
-        cumulative.append((cum, mineral))
-    # Select mineral
-    for threshold, mineral in cumulative:
-        if normalized < threshold:
-            return mineral
-    return cumulative[-1][1] # Fallback
-def generate_3d_chunk(seed, size, x_offset=0, y_offset=0, z_offset=0, prob_offsets=None, allowed_minerals=None, use_vein_bias=True):
-    if prob_offsets is None:
-        prob_offsets = {}
-    if allowed_minerals is None:
-        allowed_minerals = []
-    # Prepare hashable args for cache
-    prob_offsets_tuple = tuple(sorted(prob_offsets.items()))
-    allowed_minerals_tuple = tuple(sorted(allowed_minerals))
-    # Initial chunk without bias
-    chunk = [
-        [
-            [
-                get_mineral_type_no_bias(seed, x + x_offset, y + y_offset, z + z_offset, prob_offsets_tuple, allowed_minerals_tuple)
-                for z in range(size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for mineral in sorted_names:
+            cum = cum + weights[mineral] / total
+            picks += cum <= u
+    ids = sorted_ids[np.minimum(picks, len(sorted_ids) - 1)]
+    ids[total <= 0] = 0
+    return ids
+def shift_neighbours(mask):
+    """Voxels with at least one 6-connected neighbour set in mask"""
+    out = np.zeros_like(mask)
+    out[1:] |= mask[:-1]
+    out[:-1] |= mask[1:]
+    out[:, 1:] |= mask[:, :-1]
+    out[:, :-1] |= mask[:, 1:]
+    out[:, :, 1:] |= mask[:, :, :-1]
+    out[:, :, :-1] |= mask[:, :, 1:]
+    return out
+def apply_vein_bias(ids, u, gz, model, max_iterations=VEIN_BIAS_ITERATIONS):
+    """
+    Iterative vein biasing over an [x][y][z] id grid.
+    Every pass reads the previous pass's grid. A voxel only depends on its six neighbours, so after the
+    first pass only voxels next to a change are re-evaluated, and the loop ends when a pass changes nothing.
+    """
+    gz = np.broadcast_to(gz, ids.shape)
+    layer_index = np.full(ids.shape, -1, dtype=np.int8) # Voxels outside every layer are always void
+    tables = []
+    for i, (layer_key, (min_z, max_z)) in enumerate(layers_map.items()):
+        layer_index[(gz >= min_z) & (gz < max_z)] = i
+        tables.append(model.vein_tables[layer_key])
+    padded = np.full(tuple(n + 2 for n in ids.shape), NO_NEIGHBOUR, dtype=np.uint8)
+    active = np.ones(ids.shape, dtype=bool)
+    current = ids
+    for _ in range(max_iterations):
+        ax, ay, az = np.nonzero(active)
+        if ax.size == 0:
+            break
+        padded[1:-1, 1:-1, 1:-1] = current
+        px, py, pz = ax + 1, ay + 1, az + 1
+        neighbour_ids = np.stack([
+            padded[px + 1, py, pz], padded[px - 1, py, pz],
+            padded[px, py + 1, pz], padded[px, py - 1, pz],
+            padded[px, py, pz + 1], padded[px, py, pz - 1]
+        ])
+        new_values = np.zeros(ax.size, dtype=np.uint8)
+        active_layers = layer_index[ax, ay, az]
+        for i, table in enumerate(tables):
+            sel = active_layers == i
+            if sel.any():
+                new_values[sel] = select_vein_biased(table, u[ax[sel], ay[sel], az[sel]], neighbour_ids[:, sel])
+        changed = new_values != current[ax, ay, az]
+        if not changed.any():
+            break
+        current = current.copy()
+        current[ax, ay, az] = new_values
+        changed_mask = np.zeros(ids.shape, dtype=bool)
+        changed_mask[ax[changed], ay[changed], az[changed]] = True
+        active = shift_neighbours(changed_mask)
+    return current
+def generate_3d_chunk_ids(seed, size, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256'):
+    """Batched chunk (size may be an (nx, ny, nz) box) as a uint8 array of MINERAL_NAMES ids, indexed [x][y][z]"""
+    if model is None:
+        model = compile_probability_model()
+    xs, ys, zs = chunk_coordinates(size, x_offset, y_offset, z_offset)
+    # Hash once; the vein-bias passes reuse the same uniforms
+    u = hash_uniforms(seed, xs.ravel(), ys.ravel(), zs.ravel(), noise).reshape(xs.shape)
+    ids = model.classify(u, zs)
+    if use_vein_bias:
+        ids = apply_vein_bias(ids, u, zs, model)
+    return ids
+def shared_block_layout(shape, with_uniforms):
+    return [('ids', shape, np.uint8)] + ([('u', shape, np.float64)] if with_uniforms else [])
+def fill_block_task(shm_name, shape, x_start, x_stop, seed, x_offset, y_offset, z_offset, model_args, noise, with_uniforms, id_generation):
+    """Worker task: classify planes [x_start, x_stop) of a box into the caller's shared memory"""
+    if TABLES.id_generation != id_generation:
+        raise StaleTablesError(f"Worker tables are {TABLES.id_generation}, task needs {id_generation}")
+    shared = SharedArrays(shared_block_layout(shape, with_uniforms), name=shm_name)
+    try:
+        xs, ys, zs = chunk_coordinates((x_stop - x_start, shape[1], shape[2]), x_offset + x_start, y_offset, z_offset)
+        u = hash_uniforms(seed, xs.ravel(), ys.ravel(), zs.ravel(), noise).reshape(xs.shape)
+        shared.arrays['ids'][x_start:x_stop] = compile_probability_model(*model_args).classify(u, zs)
+        if with_uniforms:
+            shared.arrays['u'][x_start:x_stop] = u
+    finally:
+        shared.close()
+def warm_worker(minerals_data=None, version=1):
+    # Workers import this module afresh, so they install the parent's tables (not whatever minerals.json holds now)
+    # and compile the default model; request models are memoized per worker
+    if minerals_data is not None:
+        install_mineral_tables(MineralTables(minerals_data, version))
+    compile_probability_model()
+def generate_3d_chunk_ids_parallel(seed, size, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256', blocks=None):
+    """
+    generate_3d_chunk_ids split into x sub-blocks on the worker pool (same output).
+    Workers hash and classify their sub-block into shared memory; vein bias then runs once over the whole box
+    here, reusing the workers' uniforms, so results match the serial path exactly.
+    """
+    if model is None:
+        model = compile_probability_model()
+    shape = size if isinstance(size, tuple) else (size, size, size)
+    model_args = (model.prob_offsets_tuple, model.allowed_minerals_tuple)
+    with SharedArrays(shared_block_layout(shape, use_vein_bias)) as shared:
+        pool = get_pool(warm_worker, (TABLES.minerals_data, TABLES.version))
+        try:
+            futures = [
+                pool.submit(fill_block_task, shared.name, shape, x_start, x_stop, seed, x_offset, y_offset, z_offset, model_args, noise, use_vein_bias, model.id_generation)
+                for x_start, x_stop in split_range(shape[0], blocks or GEN_WORKERS)
             ]
-            for y in range(size)
-        ]
-        for x in range(size)
-    ]
-    if not use_vein_bias:
-        return chunk
-    # Helper to get layer key from gz
-    def get_layer_key(gz):
-        if 0 <= gz < 10:
-            return "0-10"
-        elif 10 <= gz < 35:
-            return "11-35"
+            for future in futures:
+                future.result()
+        except RuntimeError: # StaleTablesError from a worker, or submit() on a retired pool
+            # minerals.json was swapped mid-request: finish serially here, on the tables this model was compiled from
+            return generate_3d_chunk_ids(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise)
+        ids = shared.arrays['ids'].copy()
+        if use_vein_bias:
+            gz = np.arange(shape[2], dtype=np.int64) + z_offset
+            ids = apply_vein_bias(ids, shared.arrays['u'], gz, model)
+    return ids
+def cached_chunk_ids(seed, size, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256', parallel=False):
+    """
+    generate_3d_chunk_ids (or its parallel variant) through CHUNK_CACHE, or a view of CHUNK_STORE's memory map when the
+    chunk was pre-generated there; the returned array is shared and read-only
+    """
+    if model is None:
+        model = compile_probability_model()
+    key = chunk_cache_key(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise)
+    ids = CHUNK_CACHE.get(key)
+    if ids is None:
+        ids = CHUNK_STORE.get(seed, noise, size, model.fingerprint, use_vein_bias, x_offset, y_offset, z_offset)
+    if ids is None:
+        generate = generate_3d_chunk_ids_parallel if parallel else generate_3d_chunk_ids
+        ids = cache_generated(CHUNK_CACHE, key, generate(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise), TABLES.id_generation)
+    return ids
+def chunk_cache_key(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise):
+    # The id generation goes last so a catalog reload can drop exactly the entries whose ids the edit changed
+    return (seed, noise, (x_offset, y_offset, z_offset), size, model.fingerprint, use_vein_bias, model.id_generation)
+# Level-of-detail chunks: each of the size^3 cells stands for a (2**lod)^3 block of voxels
+LOD_MAX_LEVEL = 6
+LOD_METHODS = ('center', 'summary', 'majority')
+LOD_MAJORITY_MAX_VOXELS = 128 ** 3 # 'majority' generates every voxel of the block region (plus float noise fields several times its size)
+def lod_center_ids(seed, size, block, x_offset, y_offset, z_offset, model, noise):
+    """Point sample at each block's centre voxel (unbiased): size^3 hashes whatever the block size"""
+    centres = np.arange(size, dtype=np.int64) * block + block // 2
+    xs, ys, zs = np.meshgrid(centres + x_offset, centres + y_offset, centres + z_offset, indexing='ij')
+    return sample_points(seed, xs, ys, zs, model, noise)
+def lod_summary_ids(size, block, z_offset, model):
+    """Most likely mineral of each block from the layer probabilities alone (no hashing): blocks only differ by depth"""
+    zs = np.arange(size * block, dtype=np.int64) + z_offset
+    plane_probs = np.zeros((zs.size, len(model.mineral_tables.names)), dtype=np.float64)
+    plane_probs[:, 0] = 1.0 # Depths outside every layer are void
+    for layer_key, (min_z, max_z) in layers_map.items():
+        mask = (zs >= min_z) & (zs < max_z)
+        if mask.any():
+            plane_probs[mask] = model.layer_distribution(layer_key)
+    # Expected counts per block; argmax keeps the lowest id on ties
+    column = plane_probs.reshape(size, block, -1).sum(axis=1).argmax(axis=1).astype(np.uint8)
+    return np.ascontiguousarray(np.broadcast_to(column, (size, size, size)))
+def block_majority(ids, block):
+    """Most frequent id in each block^3 block of ids (lowest id on ties)"""
+    n = ids.shape[0] // block
+    blocks = ids.reshape(n, block, n, block, n, block).transpose(0, 2, 4, 1, 3, 5).reshape(n, n, n, block ** 3)
+    blocks = np.sort(blocks, axis=-1)
+    # Length of the run ending at each position of the sorted block; the longest run is the mode
+    positions = np.arange(block ** 3, dtype=np.int32)
+    run_start = np.where(np.concatenate([np.ones(blocks.shape[:3] + (1,), dtype=bool), blocks[..., 1:] != blocks[..., :-1]], axis=-1), positions, 0)
+    run_length = positions - np.maximum.accumulate(run_start, axis=-1)
+    best = run_length.argmax(axis=-1)[..., None]
+    return np.take_along_axis(blocks, best, axis=-1)[..., 0]
+def lod_chunk_ids(seed, size, lod, method, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256', parallel=False):
+    """
+    size^3 cells covering a (size * 2**lod)^3 region, through CHUNK_CACHE (one entry per level, method and chunk).
+    center: the voxel at each block centre; summary: most likely mineral from the layer probabilities;
+    majority: exact most frequent voxel of each block (vein bias applied if asked; region capped at LOD_MAJORITY_MAX_VOXELS).
+    """
+    if model is None:
+        model = compile_probability_model()
+    if method not in LOD_METHODS:
+        raise ValueError(f"Unknown LOD method: {method} (use {', '.join(LOD_METHODS)})")
+    if not (0 <= lod <= LOD_MAX_LEVEL):
+        raise ValueError(f"lod must be between 0 and {LOD_MAX_LEVEL}")
+    if lod == 0:
+        return cached_chunk_ids(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise, parallel)
+    block = 2 ** lod
+    bias = use_vein_bias and method == 'majority' # The other methods never look at neighbouring voxels
+    key = ('lod', lod, method) + chunk_cache_key(seed, size, x_offset, y_offset, z_offset, model, bias, noise)
+    ids = CHUNK_CACHE.get(key)
+    if ids is None:
+        if method == 'center':
+            ids = lod_center_ids(seed, size, block, x_offset, y_offset, z_offset, model, noise)
+        elif method == 'summary':
+            ids = lod_summary_ids(size, block, z_offset, model)
         else:
-            return "36-inf"
-    # Helper to get neighbors within bounds
-    def get_neighbors(ix, iy, iz):
-        candidates = [
-            (ix+1, iy, iz), (ix-1, iy, iz),
-            (ix, iy+1, iz), (ix, iy-1, iz),
-            (ix, iy, iz+1), (ix, iy, iz-1)
-        ]
-        return [(nx, ny, nz) for nx, ny, nz in candidates if 0 <= nx < size and 0 <= ny < size and 0 <= nz < size]
-    # Iterative biasing
-    max_iterations = 5 # Number of iterations for convergence
-    for _ in range(max_iterations):
-        new_chunk = [[[None for _ in range(size)] for _ in range(size)] for _ in range(size)]
-        for lx in range(size):
-            for ly in range(size):
-                for lz in range(size):
-                    # Get base probs
-                    gz = lz + z_offset # Global z
-                    layer_probs = None
-                    for (min_z, max_z), probs in DEPTH_LAYERS.items():
-                        if min_z <= gz < max_z:
-                            layer_probs = probs.copy()
-                            break
-                    if not layer_probs:
-                        new_chunk[lx][ly][lz] = 'void'
-                        continue
-                    # Apply offsets
-                    for mineral, offset in prob_offsets.items():
-                        if mineral in layer_probs:
-                            layer_probs[mineral] = max(0, layer_probs[mineral] + offset)
-                    # Filter allowed
-                    if allowed_minerals:
-                        layer_probs = {k: v for k, v in layer_probs.items() if k in allowed_minerals}
-                    # Apply vein bias based on current chunk neighbors
-                    neighbors = get_neighbors(lx, ly, lz)
-                    layer_key = get_layer_key(gz)
-                    for nx, ny, nz in neighbors:
-                        n_mineral = chunk[nx][ny][nz]
-                        if n_mineral in minerals_data['minerals']:
-                            mineral_data = minerals_data['minerals'][n_mineral]
-                            if 'vein_boost_layers' in mineral_data:
-                                boost = mineral_data['vein_boost_layers'].get(layer_key)
-                                if boost is not None and boost > 0 and n_mineral in layer_probs:
-                                    layer_probs[n_mineral] += boost
-                    # Normalize and select (same as in get_mineral_type_no_bias)
-                    total = sum(layer_probs.values())
-                    if total <= 0:
-                        new_chunk[lx][ly][lz] = 'void'
-                        continue
-                    # Get normalized from hash (same as before)
-                    gx = lx + x_offset
-                    gy = ly + y_offset
-                    input_str = f"{seed}:{gx}:{gy}:{gz}"
-                    hash_digest = hashlib.sha256(input_str.encode()).digest()
-                    hash_int = int.from_bytes(hash_digest[-8:], 'big')
-                    normalized = hash_int / (2 ** 64)
-                    # Cumulative
-                    cum = 0.0
-                    cumulative = []
-                    for mineral in sorted(layer_probs.keys()):
-                        prob = layer_probs[mineral] / total
-                        cum += prob
-                        cumulative.append((cum, mineral))
-                    # Select
-                    selected = cumulative[-1][1] # Fallback
-                    for threshold, mineral in cumulative:
-                        if normalized < threshold:
-                            selected = mineral
-                            break
-                    new_chunk[lx][ly][lz] = selected
-        chunk = new_chunk
-    return chunk
-def generate_2d_slice(seed, size, z, x_offset=0, y_offset=0, prob_offsets=None, allowed_minerals=None):
-    if prob_offsets is None:
-        prob_offsets = {}
-    if allowed_minerals is None:
-        allowed_minerals = []
-    prob_offsets_tuple = tuple(sorted(prob_offsets.items()))
-    allowed_minerals_tuple = tuple(sorted(allowed_minerals))
+            if (size * block) ** 3 > LOD_MAJORITY_MAX_VOXELS:
+                raise ValueError(f"majority LOD needs every voxel; size * 2**lod must be at most {round(LOD_MAJORITY_MAX_VOXELS ** (1 / 3))}")
+            generate = generate_3d_chunk_ids_parallel if parallel else generate_3d_chunk_ids
+            ids = block_majority(generate(seed, size * block, x_offset, y_offset, z_offset, model, bias, noise), block)
+        ids = cache_generated(CHUNK_CACHE, key, ids, TABLES.id_generation)
+    return ids
+# Streaming /api/chunk3d emits the chunk one x-slab at a time
+STREAM_SLAB_WIDTH = 8 # x-planes per slab; bounds peak memory to size * size * 8 voxels
+def iter_chunk_slabs(seed, size, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256', slab_width=STREAM_SLAB_WIDTH):
+    """
+    Returns (vein_bias_mode, slab generator) for a size^3 chunk, slabs indexed [x][y][z].
+    A fully cached chunk is sliced as-is ('full' bias); otherwise each slab is generated on its own,
+    so vein bias is computed slab-locally ('slab_local') and nothing chunk-sized is held in memory.
+    """
+    if model is None:
+        model = compile_probability_model()
+    cached = CHUNK_CACHE.get(chunk_cache_key(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise))
+    if cached is None:
+        cached = CHUNK_STORE.get(seed, noise, size, model.fingerprint, use_vein_bias, x_offset, y_offset, z_offset)
+    if not use_vein_bias:
+        mode = 'off'
+    else:
+        mode = 'full' if cached is not None else 'slab_local'
+    def slabs():
+        for x0 in range(0, size, slab_width):
+            width = min(slab_width, size - x0)
+            if cached is not None:
+                yield cached[x0:x0 + width]
+            else:
+                yield generate_3d_chunk_ids(seed, (width, size, size), x_offset + x0, y_offset, z_offset, model, use_vein_bias, noise)
+    return mode, slabs()
+# Batch /api/chunks3d limits
+BATCH_MAX_CHUNKS = 64
+BATCH_MAX_VOXELS = 4 * 128 ** 3 # Cap on the bounding region generated for seamless vein bias
+BATCH_MAX_TOTAL_VOXELS = 4 * 128 ** 3 # Cap on the chunks returned in one batch, in any mode
+BATCH_MAX_JSON_VOXELS = 128 ** 3 # Tighter cap for JSON bodies, built as nested lists of names (one size-128 /api/chunk3d)
+def generate_chunk_batch(seed, size, coords, x_offset=0, y_offset=0, z_offset=0, model=None, use_vein_bias=False, noise='sha256', parallel=False, max_voxels=BATCH_MAX_TOTAL_VOXELS):
+    """
+    Id arrays for chunk coordinates coords (list of (cx, cy, cz)) sharing one model and noise backend.
+    Returns (vein_bias_mode, chunks). Without vein bias every chunk goes through CHUNK_CACHE. With vein bias
+    the bounding region is hashed and relaxed in one piece, so shared borders are seamless ('seamless'),
+    and each chunk is sliced out of it. parallel spreads the hashing over the worker pool.
+    Batches over max_voxels in total are refused before anything is generated.
+    """
+    if model is None:
+        model = compile_probability_model()
+    if len(coords) > BATCH_MAX_CHUNKS:
+        raise ValueError(f"At most {BATCH_MAX_CHUNKS} chunks per batch")
+    if len(coords) * size ** 3 > max_voxels:
+        raise ValueError(f"Batch too large: {len(coords)} chunks of {size}^3 exceed {max_voxels} voxels; request fewer or smaller chunks")
+    def origin(c):
+        return x_offset + size * c[0], y_offset + size * c[1], z_offset + size * c[2]
+    if not use_vein_bias:
+        return 'off', [cached_chunk_ids(seed, size, *origin(c), model, False, noise, parallel) for c in coords]
+    lo = np.min(np.array(coords), axis=0)
+    shape = tuple(int(n) * size for n in np.max(np.array(coords), axis=0) - lo + 1)
+    if shape[0] * shape[1] * shape[2] > BATCH_MAX_VOXELS:
+        raise ValueError("Batch region too large for seamless vein bias; request fewer or closer chunks")
+    generate = generate_3d_chunk_ids_parallel if parallel else generate_3d_chunk_ids
+    region = generate(seed, shape, *origin(lo), model, True, noise)
+    chunks = []
+    for c in coords:
+        x0, y0, z0 = ((np.array(c) - lo) * size).tolist()
+        chunks.append(region[x0:x0 + size, y0:y0 + size, z0:z0 + size])
+    return 'seamless', chunks
+def ids_to_names(ids, tables=None):
+    """Nested lists of mineral names for an id array (the JSON chunk layout), in the palette of `tables` (default: current)"""
+    return (tables or TABLES).names_array[ids].tolist()
+def generate_3d_chunk(seed, size, x_offset=0, y_offset=0, z_offset=0, prob_offsets=None, allowed_minerals=None, use_vein_bias=True, noise=None):
+    noise = resolve_noise_backend(seed, noise)
+    model = probability_model(prob_offsets, allowed_minerals)
+    return ids_to_names(cached_chunk_ids(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise), model.mineral_tables)
+def generate_2d_slice(seed, size, z, x_offset=0, y_offset=0, prob_offsets=None, allowed_minerals=None, noise=None):
+    noise = resolve_noise_backend(seed, noise)
+    model = probability_model(prob_offsets, allowed_minerals)
+    xs, ys = np.meshgrid(np.arange(size, dtype=np.int64) + x_offset, np.arange(size, dtype=np.int64) + y_offset, indexing='ij')
+    zs = np.full(xs.shape, z, dtype=np.int64)
+    u = hash_uniforms(seed, xs.ravel(), ys.ravel(), zs.ravel(), noise).reshape(xs.shape)
+    return ids_to_names(model.classify(u, z), model.mineral_tables)
+def slice_ids(seed, size, z, x_offset, y_offset, model, noise):
+    """Mineral ids of a size x size plane at depth z, indexed [y, x] like an image"""
+    ys, xs = np.meshgrid(np.arange(size, dtype=np.int64) + y_offset, np.arange(size, dtype=np.int64) + x_offset, indexing='ij')
+    zs = np.full(xs.shape, z, dtype=np.int64)
+    u = hash_uniforms(seed, xs.ravel(), ys.ravel(), zs.ravel(), noise).reshape(xs.shape)
+    return model.classify(u, z)
+def sample_points(seed, xs, ys, zs, model, noise):
+    """Mineral ids (unbiased) at arbitrary global voxel coordinates; only the requested points are hashed"""
+    xs, ys, zs = (np.asarray(a, dtype=np.int64) for a in (xs, ys, zs))
+    u = hash_uniforms(seed, xs.ravel(), ys.ravel(), zs.ravel(), noise).reshape(xs.shape)
+    return model.classify(u, zs)
+def section_coordinates(plane, width, height, x_offset=0, y_offset=0, z_offset=0, at=0, origin=(0, 0, 0), u_axis=(1, 0, 0), v_axis=(0, 0, 1)):
+    """
+    Global voxel coordinates [row][col] of a section plane. xz/yz planes sit at y=at/x=at with rows running down in z,
+    xy at z=at; oblique samples origin + col * u_axis + row * v_axis, rounded to the nearest voxel.
+    """
+    rows, cols = np.meshgrid(np.arange(height, dtype=np.int64), np.arange(width, dtype=np.int64), indexing='ij')
+    if plane == 'xz':
+        xs, ys, zs = cols, np.full_like(cols, at), rows
+    elif plane == 'yz':
+        xs, ys, zs = np.full_like(cols, at), cols, rows
+    elif plane == 'xy':
+        xs, ys, zs = cols, rows, np.full_like(cols, at)
+    elif plane == 'oblique':
+        points = np.asarray(origin, dtype=np.float64) + cols[..., None] * np.asarray(u_axis, dtype=np.float64) + rows[..., None] * np.asarray(v_axis, dtype=np.float64)
+        xs, ys, zs = np.moveaxis(np.floor(points + 0.5).astype(np.int64), -1, 0)
+    else:
+        raise ValueError(f"Unknown plane: {plane} (use xz, yz, xy or oblique)")
+    return xs + x_offset, ys + y_offset, zs + z_offset
+def generate_section_ids(seed, plane, width, height, x_offset=0, y_offset=0, z_offset=0, model=None, noise='sha256', **plane_args):
+    """uint8 ids [row][col] of a vertical, horizontal or oblique section (see section_coordinates)"""
+    xs, ys, zs = section_coordinates(plane, width, height, x_offset, y_offset, z_offset, **plane_args)
+    return sample_points(seed, xs, ys, zs, model or compile_probability_model(), noise)
+def generate_borehole_ids(seed, x, y, z_top, depth, x_offset=0, y_offset=0, z_offset=0, model=None, noise='sha256'):
+    """uint8 ids of the column at (x, y) from z_top down through depth voxels"""
+    zs = np.arange(depth, dtype=np.int64) + z_top + z_offset
+    return sample_points(seed, np.full_like(zs, x + x_offset), np.full_like(zs, y + y_offset), zs, model or compile_probability_model(), noise)
+def borehole_intervals(ids, z_top, tables=None):
+    """Runs of one mineral down a column as {z_start, z_end (exclusive), mineral}, local z like the request"""
+    names = (tables or TABLES).names
+    lengths, values = chunk_codec.run_lengths(ids)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) + z_top
     return [
-        [
-            get_mineral_type_no_bias(seed, x + x_offset, y + y_offset, z, prob_offsets_tuple, allowed_minerals_tuple)
-            for y in range(size)
-        ]
-        for x in range(size)
+        {'z_start': int(start), 'z_end': int(start + length), 'mineral': names[value]}
+        for start, length, value in zip(starts, lengths, values)
     ]
-def generate_slice(seed, size, z_offset=0, x_offset=0, y_offset=0, zoom=1, prob_offsets=None):
+# /api/stats: mineral composition of a box without generating it
+STATS_SAMPLE_BLOCK = 8 # Edge of the sampled sub-blocks (vein bias needs whole neighbourhoods, not single voxels)
+STATS_DEFAULT_SAMPLES = 16384 # Sampled voxels per depth layer
+STATS_MAX_SAMPLES = 262144
+STATS_EXACT_MAX_VOXELS = 64 ** 3 # Smaller biased boxes are generated and counted outright
+STATS_Z = 1.96 # 95% confidence bounds
+def layer_spans(z0, z1):
+    """(layer_key, lo, hi) for each layer overlapping the depth range [z0, z1), and the number of depths in no layer"""
+    spans = []
+    for layer_key, (min_z, max_z) in layers_map.items():
+        lo, hi = max(z0, min_z), min(z1, max_z)
+        if hi > lo:
+            spans.append((layer_key, int(lo), int(hi)))
+    return spans, (z1 - z0) - sum(hi - lo for _, lo, hi in spans)
+def biased_block_ids(seed, x0, y0, z0, shape, model, noise):
+    """Vein-biased ids of a box as in a seamless batch: generated with a halo as deep as the relaxation can reach"""
+    halo = VEIN_BIAS_ITERATIONS
+    nx, ny, nz = shape
+    ids = generate_3d_chunk_ids(seed, (nx + 2 * halo, ny + 2 * halo, nz + 2 * halo), x0 - halo, y0 - halo, z0 - halo, model, True, noise)
+    return ids[halo:halo + nx, halo:halo + ny, halo:halo + nz]
+def sample_layer_fractions(seed, x0, y0, x1, y1, lo, hi, model, noise, samples, rng):
+    """Stratum estimate: (mean fraction per id, standard error per id) from random vein-biased sub-blocks inside the layer"""
+    bx, by, bz = min(STATS_SAMPLE_BLOCK, x1 - x0), min(STATS_SAMPLE_BLOCK, y1 - y0), min(STATS_SAMPLE_BLOCK, hi - lo)
+    n_blocks = max(2, -(-samples // (bx * by * bz)))
+    n = len(model.mineral_tables.names)
+    fractions = np.empty((n_blocks, n), dtype=np.float64)
+    for b in range(n_blocks):
+        px = int(rng.integers(x0, x1 - bx + 1))
+        py = int(rng.integers(y0, y1 - by + 1))
+        pz = int(rng.integers(lo, hi - bz + 1))
+        ids = biased_block_ids(seed, px, py, pz, (bx, by, bz), model, noise)
+        fractions[b] = np.bincount(ids.ravel(), minlength=n) / ids.size
+    # Voxels in one block are correlated, so the blocks are the independent samples
+    return fractions.mean(axis=0), fractions.std(axis=0, ddof=1) / np.sqrt(n_blocks)
+def mineral_stats(fractions, voxels, errors=None, counts=None, tables=None):
+    """{name: {...}} for the ids with a non-zero fraction"""
+    names = (tables or TABLES).names
+    out = {}
+    for i in np.flatnonzero(fractions > 0):
+        entry = {'fraction': float(fractions[i])}
+        if counts is not None:
+            entry['count'] = int(counts[i])
+        else:
+            entry['expected_count'] = float(fractions[i] * voxels)
+        if errors is not None:
+            entry['ci95'] = [float(max(0.0, fractions[i] - STATS_Z * errors[i])), float(min(1.0, fractions[i] + STATS_Z * errors[i]))]
+        out[names[i]] = entry
+    return out
+def region_stats(seed, box, model=None, use_vein_bias=False, noise='sha256', samples=STATS_DEFAULT_SAMPLES):
+    """
+    Mineral histogram per depth layer (and overall) of the half-open box [x0, x1) x [y0, y1) x [z0, z1).
+    Without vein bias the fractions are the exact expectations of the probability tables ('expected'); with it, small
+    boxes are generated and counted ('counted') and larger ones estimated from stratified sub-block samples ('sampled').
+    """
+    if model is None:
+        model = compile_probability_model()
+    x0, y0, z0, x1, y1, z1 = box
+    if x1 <= x0 or y1 <= y0 or z1 <= z0:
+        raise ValueError("box must be [x0, y0, z0, x1, y1, z1] with x1 > x0, y1 > y0 and z1 > z0")
+    columns = (x1 - x0) * (y1 - y0)
+    spans, gap_depths = layer_spans(z0, z1)
+    tables = model.mineral_tables
+    n = len(tables.names)
+    if not use_vein_bias:
+        method = 'expected'
+    elif columns * (z1 - z0) <= STATS_EXACT_MAX_VOXELS:
+        method = 'counted'
+        ids = biased_block_ids(seed, x0, y0, z0, (x1 - x0, y1 - y0, z1 - z0), model, noise)
+    else:
+        method = 'sampled'
+        rng = np.random.default_rng(int.from_bytes(hashlib.sha256(repr((seed, noise, box, model.fingerprint, samples)).encode()).digest()[:8], 'big'))
+    layers = []
+    total_fractions = np.zeros(n, dtype=np.float64)
+    total_variance = np.zeros(n, dtype=np.float64)
+    total_voxels = columns * (z1 - z0)
+    for layer_key, lo, hi in spans:
+        voxels = columns * (hi - lo)
+        errors = counts = None
+        if method == 'expected':
+            fractions = model.layer_distribution(layer_key)
+        elif method == 'counted':
+            counts = np.bincount(ids[:, :, lo - z0:hi - z0].ravel(), minlength=n)
+            fractions = counts / voxels
+        else:
+            fractions, errors = sample_layer_fractions(seed, x0, y0, x1, y1, lo, hi, model, noise, samples, rng)
+            total_variance += (voxels / total_voxels * errors) ** 2
+        total_fractions += fractions * voxels / total_voxels
+        layers.append({'layer': layer_key, 'z_range': [lo, hi], 'voxels': voxels, 'minerals': mineral_stats(fractions, voxels, errors, counts, tables)})
+    total_fractions[0] += gap_depths * columns / total_voxels # Depths between layers are always void
+    total_errors = np.sqrt(total_variance) if method == 'sampled' else None
+    total_counts = np.rint(total_fractions * total_voxels).astype(np.int64) if method == 'counted' else None
+    return {
+        'box': [x0, y0, z0, x1, y1, z1],
+        'voxels': total_voxels,
+        'vein_bias': use_vein_bias,
+        'method': method,
+        'layers': layers,
+        'void_outside_layers': gap_depths * columns,
+        'total': mineral_stats(total_fractions, total_voxels, total_errors, total_counts, tables)
+    }
+def generate_slice(seed, size, z_offset=0, x_offset=0, y_offset=0, zoom=1, prob_offsets=None, noise=None):
     """
     Generate a 2D numpy array of colors for the slice at z.
     """
-    if prob_offsets is None:
-        prob_offsets = {}
-    prob_offsets_tuple = tuple(sorted(prob_offsets.items()))
+    noise = resolve_noise_backend(seed, noise)
     effective_size = size // zoom
+    grid = np.zeros((size, size, 3), dtype=np.uint8) # Black where size isn't a multiple of zoom
     if effective_size <= 0:
-        return np.zeros((size, size, 3), dtype=np.uint8) # Fallback to black
-    small_grid = np.zeros((effective_size, effective_size, 3), dtype=np.uint8)
-    for x in range(effective_size):
-        for y in range(effective_size):
-            mineral = get_mineral_type_no_bias(seed, x_offset + x, y_offset + y, z_offset, prob_offsets_tuple)
-            small_grid[y, x] = MINERAL_COLORS[mineral] # Note: For pygame or similar
-    grid = np.repeat(small_grid, zoom, axis=0)
-    grid = np.repeat(grid, zoom, axis=1)
-    # If not exact size, pad with black
-    if grid.shape[0] < size:
-        padded = np.zeros((size, size, 3), dtype=np.uint8)
-        padded[:grid.shape[0], :grid.shape[1]] = grid
-        grid = padded
+        return grid
+    model = probability_model(prob_offsets)
+    ids = slice_ids(seed, effective_size, z_offset, x_offset, y_offset, model, noise)
+    # Nearest-neighbour zoom as one strided write of the small colour plane
+    zoomed = grid[:effective_size * zoom, :effective_size * zoom].reshape(effective_size, zoom, effective_size, zoom, 3)
+    zoomed[...] = model.mineral_tables.palette[ids][:, None, :, None, :]
     return grid
-    
+def slice_etag(seed, size, z, x_offset, y_offset, zoom, model, noise):
+    key = (seed, noise, size, z, x_offset, y_offset, zoom, model.fingerprint, model.mineral_tables.palette.tobytes())
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+def render_slice_png(seed, size, z, x_offset, y_offset, zoom, model, noise, etag):
+    """PNG bytes of a slice, from SLICE_CACHE when the same slice was rendered before"""
+    key = (etag, model.generation)
+    cached = SLICE_CACHE.get(key)
+    if cached is not None:
+        return cached.tobytes()
+    effective_size = size // zoom
+    ids = slice_ids(seed, effective_size, z, x_offset, y_offset, model, noise)
+    tables = model.mineral_tables
+    png = encode_indexed_png(ids, tables.palette, zoom, size, tables.pad_color_id)
+    cache_generated(SLICE_CACHE, key, np.frombuffer(png, dtype=np.uint8).copy(), TABLES.generation)
+    return png
+def fetch_json_cached(source, key, url, headers=None, timeout=10):
+    """GET url as JSON through GEO_CACHE; failures are cached briefly and come back as None"""
+    hit, value = GEO_CACHE.get(source, key)
+    if hit:
+        return value
+    try:
+        resp = UPSTREAM.get(url, headers=headers, timeout=timeout)
+        value = resp.json() if resp.ok else None
+        if value is None:
+            print(f"{source} query failed: {resp.status_code}")
+    except (CircuitOpenError, RateLimitedError) as e:
+        print(f"{source} skipped: {e}")
+        return None # Not cached: the upstream was never asked
+    except Exception as e:
+        print(f"{source} fetch error: {e}")
+        value = None
+    GEO_CACHE.put(source, key, value)
+    return value
+# Concurrent upstream lookups after geocoding
+UPSTREAM_DEADLINE = float(os.environ.get('LITHOS_UPSTREAM_DEADLINE', 12)) # Seconds shared by elevation, plate and deposit lookups
+UPSTREAM_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix='upstream')
+MINDAT_CONCURRENCY = 4 # Parallel per-locality Mindat requests
+MINDAT_POOL = ThreadPoolExecutor(max_workers=MINDAT_CONCURRENCY, thread_name_prefix='mindat')
+def wait_upstream(future, deadline, label):
+    """Result of an upstream future by the shared deadline, or None (each source falls back on its own)"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        print(f"{label} lookup missed the deadline")
+    except Exception as e:
+        print(f"{label} fetch error: {e}")
+    return None
+def fetch_elevation(lat, lon):
+    return fetch_json_cached('elevation', coord_key(lat, lon), f"https://api.open-elevation.com/api/v1/lookup?locations={lat},{lon}")
+def fetch_mrds_minerals(lat, lon):
+    """(commodity counter weighted by deposit size, raw response) from USGS MRDS within +-1 degree"""
+    minerals_counter = Counter()
+    mrds_url = f"https://mrdata.usgs.gov/mrds/search-bbox.php?min_lat={lat-1}&max_lat={lat+1}&min_lon={lon-1}&max_lon={lon+1}&format=json"
+    mrds_data = fetch_json_cached('mrds', bbox_key(lat - 1, lat + 1, lon - 1, lon + 1), mrds_url, timeout=8)
+    if mrds_data is not None:
+        for f in mrds_data.get('features', []):
+            dep_size = f['properties'].get('dep_size', 'M')
+            size_factor = {'L': 3, 'M': 2, 'S': 1}.get(dep_size.upper(), 1)
+            comm = f['properties'].get('commodity', '')
+            comms = [m.strip().lower() for m in comm.split(',') if m.strip()]
+            for c in comms:
+                minerals_counter[c] += size_factor
+    return minerals_counter, mrds_data
+def fetch_mindat_minerals(lat, lon, api_key, deadline):
+    """(mineral counter, localities response) from Mindat; per-locality lookups fan out on MINDAT_POOL"""
+    minerals_counter = Counter()
+    if not api_key:
+        print("Mindat API key not set. Skipping Mindat query.")
+        return minerals_counter, None
+    mindat_headers = {"Authorization": f"Token {api_key}"}
+    # Query localities in a box (±1 degree)
+    localities_url = f"https://api.mindat.org/localities/?lat__gte={lat-1}&lat__lte={lat+1}&lon__gte={lon-1}&lon__lte={lon+1}&limit=20"
+    localities_data = fetch_json_cached('mindat_localities', bbox_key(lat - 1, lat + 1, lon - 1, lon + 1), localities_url, mindat_headers)
+    if localities_data is None:
+        return minerals_counter, None
+    # Query minerals for each locality
+    futures = [
+        MINDAT_POOL.submit(fetch_json_cached, 'mindat_minerals', str(loc['id']), f"https://api.mindat.org/minerals/?locality={loc['id']}", mindat_headers)
+        for loc in localities_data.get('results', [])
+    ]
+    for future in futures: # Merge in locality order so counts (and ties) match the sequential version
+        locality_minerals = wait_upstream(future, deadline, 'Mindat locality')
+        if locality_minerals is not None:
+            for minr in locality_minerals.get('results', []):
+                name = minr.get('name', '').lower()
+                if name:
+                    minerals_counter[name] += 1  # Count occurrences
+    return minerals_counter, localities_data
 def get_offsets_from_location(location: str):
     hash_obj = hashlib.sha256(location.encode())
     hash_bytes = hash_obj.digest()
@@ -303,6 +856,7 @@ def get_offsets_from_location(location: str):
     plate = None
     # Build debug_info incrementally to avoid reference errors
     debug_info = {'location': location}
+    fallbacks = debug_info['fallbacks'] = [] # Lookups that fell back to defaults; such results are not stored
     use_mindat = False  # Toggle: Set to True to use Mindat API instead of MRDS for testing
     MINDAT_API_KEY = ""  # Set your Mindat API key here if using Mindat
     try:
@@ -313,32 +867,37 @@ def get_offsets_from_location(location: str):
             lat, lon = float(parts[0]), float(parts[1])
             # Perform reverse geocoding to get details for lat,lon inputs
             url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&limit=1&extratags=1"
-            resp = requests.get(url, headers=HEADERS, timeout=10)
-            if resp.ok and resp.json():
-                debug_info['geocoding_response'] = resp.json()
-                data = resp.json()  # Reverse returns a single dict
+            geocoded = fetch_json_cached('nominatim_reverse', coord_key(lat, lon), url, HEADERS)
+            if geocoded:
+                debug_info['geocoding_response'] = geocoded
+                data = geocoded  # Reverse returns a single dict
         else:
             url = f"https://nominatim.openstreetmap.org/search?q={location}&format=json&limit=1&extratags=1"
-            resp = requests.get(url, headers=HEADERS, timeout=10)
-            if resp.ok and resp.json():
-                debug_info['geocoding_response'] = resp.json()
-                data = resp.json()[0]
+            geocoded = fetch_json_cached('nominatim_search', location_key(location), url, HEADERS)
+            if geocoded:
+                debug_info['geocoding_response'] = geocoded
+                data = geocoded[0]
                 lat, lon = float(data['lat']), float(data['lon'])
         debug_info['lat'] = lat
         debug_info['lon'] = lon
         if lat is None or lon is None:
+            fallbacks.append('geocoding')
             raise ValueError("Geocoding failed")
+        # Elevation, plate and deposit lookups are independent: run them together under one deadline
+        deadline = time.monotonic() + UPSTREAM_DEADLINE
+        elevation_future = UPSTREAM_POOL.submit(fetch_elevation, lat, lon)
+        plate_future = UPSTREAM_POOL.submit(get_plate_type, lat, lon)
+        if use_mindat:
+            deposits_future = UPSTREAM_POOL.submit(fetch_mindat_minerals, lat, lon, MINDAT_API_KEY, deadline)
+        else:
+            deposits_future = UPSTREAM_POOL.submit(fetch_mrds_minerals, lat, lon)
         # Elevation (fixed URL: use comma for single location)
-        try:  # Smaller try for elevation
-            elev_resp = requests.get(
-                f"https://api.open-elevation.com/api/v1/lookup?locations={lat},{lon}",
-                timeout=10
-            )
-            if elev_resp.ok and elev_resp.json().get('results'):
-                debug_info['elevation_response'] = elev_resp.json()
-                elevation = elev_resp.json()['results'][0]['elevation']
-        except Exception as e:
-            print(f"Elevation fetch error: {e}")
+        elev_data = wait_upstream(elevation_future, deadline, 'Elevation')
+        if elev_data and elev_data.get('results'):
+            debug_info['elevation_response'] = elev_data
+            elevation = elev_data['results'][0]['elevation']
+        else:
+            fallbacks.append('elevation')
         debug_info['elevation'] = elevation  # Always add, even if default 0
         if elevation > 3000:
             prob_offsets['void'] = prob_offsets.get('void', 0) + 0.1
@@ -352,13 +911,11 @@ def get_offsets_from_location(location: str):
             prob_offsets['basalt'] = 0.35
             prob_offsets['pyroxene'] = 0.25
         # Tectonic Plate
-        try:  # Smaller try for plate
-            plate = get_plate_type(lat, lon)
-        except Exception as e:
-            print(f"Plate fetch error: {e}")
-            plate = None
+        plate = wait_upstream(plate_future, deadline, 'Plate')
         debug_info['plate_type'] = plate  # Always add
-        debug_info['tectonic_plates_response'] = 'Loaded successfully' if PLATES_GEOJSON else 'Failed to load'
+        if plate is None:
+            fallbacks.append('plate')
+        debug_info['tectonic_plates_response'] = 'Loaded successfully' if PLATE_INDEX is not None else 'Failed to load'
         if plate and ('subduction' in plate or 'convergent' in plate or 'andes' in plate or 'pacific' in plate or 'nazca' in plate):
             crust_type = "volcanic_subduction"
             prob_offsets['basalt'] = prob_offsets.get('basalt', 0) + 0.2
@@ -366,50 +923,14 @@ def get_offsets_from_location(location: str):
             prob_offsets['gold'] = prob_offsets.get('gold', 0) + 0.05
             prob_offsets['copper'] = prob_offsets.get('copper', 0) + 0.08
         # Mineral Deposits
-        if use_mindat:
-            if not MINDAT_API_KEY:
-                print("Mindat API key not set. Skipping Mindat query.")
-            else:
-                mindat_headers = {"Authorization": f"Token {MINDAT_API_KEY}"}
-                # Query localities in a box (±1 degree)
-                localities_url = f"https://api.mindat.org/localities/?lat__gte={lat-1}&lat__lte={lat+1}&lon__gte={lon-1}&lon__lte={lon+1}&limit=20"
-                try:
-                    resp = requests.get(localities_url, headers=mindat_headers, timeout=10)
-                    if resp.ok:
-                        debug_info['mindat_localities_response'] = resp.json()
-                        localities = resp.json().get('results', [])
-                        for loc in localities:
-                            loc_id = loc['id']
-                            # Query minerals for this locality
-                            minerals_url = f"https://api.mindat.org/minerals/?locality={loc_id}"
-                            miner_resp = requests.get(minerals_url, headers=mindat_headers, timeout=10)
-                            if miner_resp.ok:
-                                minerals = miner_resp.json().get('results', [])
-                                for minr in minerals:
-                                    name = minr.get('name', '').lower()
-                                    if name:
-                                        minerals_counter[name] += 1  # Count occurrences
-                    else:
-                        print(f"Mindat localities query failed: {resp.status_code}")
-                except Exception as e:
-                    print(f"Mindat error: {e}")
-        else:
-            # Use MRDS (original)
-            mrds_url = f"https://mrdata.usgs.gov/mrds/search-bbox.php?min_lat={lat-1}&max_lat={lat+1}&min_lon={lon-1}&max_lon={lon+1}&format=json"
-            try:
-                resp = requests.get(mrds_url, timeout=8)
-                if resp.ok:
-                    debug_info['mrds_response'] = resp.json()
-                    mrds_data = resp.json()
-                    for f in mrds_data.get('features', []):
-                        dep_size = f['properties'].get('dep_size', 'M')
-                        size_factor = {'L': 3, 'M': 2, 'S': 1}.get(dep_size.upper(), 1)
-                        comm = f['properties'].get('commodity', '')
-                        comms = [m.strip().lower() for m in comm.split(',') if m.strip()]
-                        for c in comms:
-                            minerals_counter[c] += size_factor
-            except Exception as e:
-                print(f"MRDS error: {e}")
+        deposits = wait_upstream(deposits_future, deadline, 'Mindat' if use_mindat else 'MRDS')
+        if deposits is None or deposits[1] is None:
+            fallbacks.append('deposits')
+        if deposits:
+            deposits_counter, deposits_response = deposits
+            minerals_counter.update(deposits_counter)
+            if deposits_response is not None:
+                debug_info['mindat_localities_response' if use_mindat else 'mrds_response'] = deposits_response
         debug_info['minerals_counter'] = dict(minerals_counter)  # Always add
         # Apply mineral boosts dynamically using minerals.json
         if minerals_counter:
@@ -437,6 +958,8 @@ def get_offsets_from_location(location: str):
                             prob_offsets[target] = prob_offsets.get(target, 0) + boost
     except Exception as e:
         print(f"[Geology Engine] Fallback mode for {location}: {e}")
+        if not fallbacks:
+            fallbacks.append('error')
     # Final crust type decision (runs even if some APIs failed)
     if prob_offsets.get('basalt', 0) > 0.25:
         crust_type = "oceanic" if elevation < 0 else "volcanic"
@@ -456,34 +979,7 @@ def get_offsets_from_location(location: str):
         'landuse': extratags.get('landuse', '').lower(),
         'crust_type': crust_type
     }
-    # Function to compute match score
-    def match_variant(variant, loc_data):
-        conditions = variant.get('conditions', {})
-        score = 0
-        if 'elevation_min' in conditions and loc_data['elevation'] >= conditions['elevation_min']:
-            score += 1
-        if 'elevation_max' in conditions and loc_data['elevation'] <= conditions['elevation_max']:
-            score += 1
-        if 'requires_tropical' in conditions and conditions['requires_tropical'] and abs(loc_data['lat']) <= 30:
-            score += 2
-        if 'requires_cold' in conditions and conditions['requires_cold'] and (abs(loc_data['lat']) >= 50 or loc_data['elevation'] >= 2000):
-            score += 2
-        if 'natural' in conditions and loc_data['natural'] in [n.lower() for n in conditions['natural']]:
-            score += 2
-        if 'landuse' in conditions and loc_data['landuse'] in [l.lower() for l in conditions['landuse']]:
-            score += 2
-        if 'crust_types' in conditions and loc_data['crust_type'] in conditions['crust_types']:
-            score += 2
-        return score
-    # Find best variant
-    best_variant = "clayey_mudflat"  # Default
-    max_score = -1
-    for variant in minerals_data['coverVariants']:
-        score = match_variant(variant, location_data)
-        if score > max_score:
-            max_score = score
-            best_variant = variant['id']
-    cover_variant = best_variant
+    cover_variant = COVER_RULES.match(location_data)
     # Add to debug_info
     debug_info['land_class'] = land_class
     debug_info['land_type'] = land_type
@@ -496,12 +992,24 @@ def get_offsets_from_location(location: str):
 
 
 
+OFFSET_FIELDS = ('x_offset', 'y_offset', 'z_offset', 'crust_type', 'prob_offsets', 'cover_variant')
+def resolve_location(location, use_store=True):
+    """get_offsets_from_location backed by the 'offsets' entries of GEO_CACHE (written live or by scripts/prewarm_geology.py)"""
+    if use_store:
+        hit, stored = GEO_CACHE.get('offsets', location)
+        if hit and stored is not None:
+            return tuple(stored[field] for field in OFFSET_FIELDS) + ({'location': location, 'stored': True},)
+    result = get_offsets_from_location(location)
+    if not result[6]['fallbacks']: # Never pin a degraded answer for the whole TTL
+        GEO_CACHE.put('offsets', location, dict(zip(OFFSET_FIELDS, result[:6])))
+    return result
 @app.route('/api/offsets', methods=['GET'])
 def api_get_offsets():
     location = request.args.get('location', '').strip()
     if not location:
         return jsonify({'error': 'Missing location parameter'}), 400
-    x_offset, y_offset, z_offset, crust_type, prob_offsets, cover_variant, debug_info = get_offsets_from_location(location)
+    debug = request.args.get('debug', 'false').lower() == 'true'
+    x_offset, y_offset, z_offset, crust_type, prob_offsets, cover_variant, debug_info = resolve_location(location, use_store=not debug)
     response = {
         'x_offset': x_offset,
         'y_offset': y_offset,
@@ -510,22 +1018,89 @@ def api_get_offsets():
         'prob_offsets': prob_offsets,
         'cover_variant': cover_variant
     }
-    if request.args.get('debug', 'false').lower() == 'true':
+    if debug:
         response['debug_info'] = debug_info
     return jsonify(response)
     
 @app.route('/api/mineral', methods=['GET'])
 def api_get_mineral():
+    seed = request.args.get('seed', 'default_seed')
+    try:
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
-        seed = request.args.get('seed', 'default_seed')
         x = int(request.args.get('x', 0))
         y = int(request.args.get('y', 0))
         z = int(request.args.get('z', 0))
-        mineral = get_mineral_type_no_bias(seed, x, y, z)
+        mineral = get_mineral_type_no_bias(seed, x, y, z, (), (), noise)
         return jsonify({'mineral': mineral})
     except ValueError:
         return jsonify({'error': 'Invalid coordinates'}), 400
    
+def wants_binary_chunk():
+    """Binary chunk format is opt-in via format=bin or the Accept header; JSON stays the default"""
+    return request.args.get('format') == 'bin' or chunk_codec.MIME_TYPE in request.headers.get('Accept', '')
+def stream_chunk_response(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise):
+    """Chunked-transfer /api/chunk3d body, one x-slab at a time; X-Vein-Bias says how vein bias was applied"""
+    mode, slabs = iter_chunk_slabs(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise)
+    headers = {'X-Vein-Bias': mode}
+    if wants_binary_chunk():
+        body = chunk_codec.iter_encode_chunk((size, size, size), slabs, model.mineral_tables.names, request.args.get('encoding', 'raw'))
+        return Response(body, mimetype=chunk_codec.MIME_TYPE, headers=headers)
+    def generate():
+        yield '{"vein_bias": %s, "chunk": [' % json.dumps(mode)
+        first = True
+        for slab in slabs:
+            for plane in ids_to_names(slab, model.mineral_tables):
+                yield ('' if first else ',') + json.dumps(plane)
+                first = False
+        yield ']}'
+    return Response(generate(), mimetype='application/json', headers=headers)
+SURFACE_KINDS = ('voxels', 'quads')
+def covered_ids(ids, depth, cover_id, mined):
+    """ids with the top `depth` z-planes showing cover_id, except at the mined (uncovered) flat indices"""
+    covered = np.zeros(ids.shape, dtype=bool)
+    covered[:, :, :depth] = True
+    covered.reshape(-1)[mined] = False
+    return np.where(covered, np.uint8(cover_id), ids)
+def surface_ids(ids, tables, lod):
+    """(ids, palette) to extract the surface from, with the request's cover layer and mined mask applied"""
+    palette = list(tables.names)
+    depth = int(request.args.get('cover_depth', 1 if 'mask' in request.args else 0))
+    if depth <= 0:
+        return ids, palette
+    if lod > 0:
+        raise ValueError("cover_depth and mask need lod=0")
+    size, key = mined_chunk(request.args)
+    mask = request.args.get('mask')
+    if mask is None:
+        mined = np.zeros(0, dtype=np.int64)
+    elif mask == 'server':
+        mined = MINED_STORE.read(key)[1]
+    else:
+        encoding = request.args.get('mask_encoding', 'rle')
+        mined = decode_index_set(mask if encoding == 'bitset' else json.loads(mask), size ** 3, encoding)
+    cover_variant = request.args.get('cover_variant') or default_cover_variant(request.args.get('seed', 'default_seed'))
+    palette.append(f'cover_{cover_variant}')
+    return covered_ids(ids, min(depth, size), len(tables.names), mined), palette
+def surface_response(kind, ids, tables, lod=0):
+    """/api/chunk3d?surface=voxels|quads: only the exposed voxels, or greedy-meshed quads, as u8 columns"""
+    ids, palette = surface_ids(ids, tables, lod)
+    if kind == 'voxels':
+        coords, voxel_ids, faces = exposed_voxels(ids)
+        columns = {'x': coords[:, 0], 'y': coords[:, 1], 'z': coords[:, 2], 'id': voxel_ids, 'faces': faces}
+    else:
+        columns = greedy_quads(ids)
+    if wants_binary_chunk():
+        return Response(chunk_codec.encode_surface(kind, ids.shape, columns, palette), mimetype=chunk_codec.MIME_TYPE)
+    return jsonify({
+        'surface': kind,
+        'shape': list(ids.shape),
+        'palette': palette,
+        'count': len(columns['id']),
+        'columns': {name: columns[name].tolist() for name in chunk_codec.SURFACE_COLUMNS[kind]}
+    })
 @app.route('/api/chunk3d', methods=['GET'])
 def api_generate_3d_chunk():
     try:
@@ -534,25 +1109,204 @@ def api_generate_3d_chunk():
         chunk_x = int(request.args.get('chunk_x', 0))
         chunk_y = int(request.args.get('chunk_y', 0))
         chunk_z = int(request.args.get('chunk_z', 0))
-        x_offset = int(request.args.get('x_offset', 0)) + size * chunk_x
-        y_offset = int(request.args.get('y_offset', 0)) + size * chunk_y
-        z_offset = int(request.args.get('z_offset', 0)) + size * chunk_z
+        lod = int(request.args.get('lod', 0))
+        lod_method = request.args.get('lod_method', 'center')
+        extent = size * 2 ** lod # World voxels spanned by the chunk along each axis
+        x_offset = int(request.args.get('x_offset', 0)) + extent * chunk_x
+        y_offset = int(request.args.get('y_offset', 0)) + extent * chunk_y
+        z_offset = int(request.args.get('z_offset', 0)) + extent * chunk_z
         prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
         allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
         use_vein_bias = request.args.get('use_vein_bias', 'True').lower() == 'true'
-        chunk = generate_3d_chunk(seed, size, x_offset, y_offset, z_offset, prob_offsets, allowed, use_vein_bias)
-        response = {'chunk': chunk}
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        parallel = request.args.get('parallel', 'false').lower() == 'true'
+        surface = request.args.get('surface')
+        if surface is not None and surface not in SURFACE_KINDS:
+            raise ValueError(f"Unknown surface: {surface} (use {', '.join(SURFACE_KINDS)})")
+        model = probability_model(prob_offsets, allowed)
+        if lod > 0:
+            ids = lod_chunk_ids(seed, size, lod, lod_method, x_offset, y_offset, z_offset, model, use_vein_bias, noise, parallel)
+            lod_headers = {'X-LOD': str(lod), 'X-LOD-Block': str(2 ** lod), 'X-LOD-Method': lod_method}
+            if surface:
+                resp = surface_response(surface, ids, model.mineral_tables, lod)
+                resp.headers.update(lod_headers)
+                return resp
+            if wants_binary_chunk():
+                body = chunk_codec.encode_chunk(ids, model.mineral_tables.names, request.args.get('encoding', 'raw'))
+                return Response(body, mimetype=chunk_codec.MIME_TYPE, headers=lod_headers)
+            return jsonify({'chunk': ids_to_names(ids, model.mineral_tables), 'lod': lod, 'block': 2 ** lod, 'lod_method': lod_method})
+        if request.args.get('stream', 'false').lower() == 'true' and not surface:
+            return stream_chunk_response(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise)
+        ids = cached_chunk_ids(seed, size, x_offset, y_offset, z_offset, model, use_vein_bias, noise, parallel)
+        if surface:
+            return surface_response(surface, ids, model.mineral_tables)
+        if wants_binary_chunk():
+            body = chunk_codec.encode_chunk(ids, model.mineral_tables.names, request.args.get('encoding', 'raw'))
+            return Response(body, mimetype=chunk_codec.MIME_TYPE)
+        response = {'chunk': ids_to_names(ids, model.mineral_tables)}
         if request.args.get('debug', 'false').lower() == 'true':
             response['debug_info'] = {
                 'seed': seed,
                 'offsets': {'x': x_offset, 'y': y_offset, 'z': z_offset},
                 'prob_offsets': prob_offsets,
                 'allowed_minerals': allowed,
-                'use_vein_bias': use_vein_bias
+                'use_vein_bias': use_vein_bias,
+                'noise': noise,
+                'chunk_cache': CHUNK_CACHE.stats(),
+                'chunk_store': {'hits': CHUNK_STORE.hits, 'misses': CHUNK_STORE.misses}
             }
         return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+def parse_chunk_coords():
+    """Chunk coordinates from chunks=[[cx, cy, cz], ...] or an inclusive box=[x0, y0, z0, x1, y1, z1]"""
+    if 'box' in request.args:
+        box = [int(v) for v in json.loads(request.args['box'])]
+        if len(box) != 6:
+            raise ValueError("box must be [x0, y0, z0, x1, y1, z1]")
+        x0, y0, z0, x1, y1, z1 = box
+        if x1 < x0 or y1 < y0 or z1 < z0:
+            raise ValueError("box must have x1 >= x0, y1 >= y0 and z1 >= z0 (both corners are inclusive)")
+        if (x1 - x0 + 1) * (y1 - y0 + 1) * (z1 - z0 + 1) > BATCH_MAX_CHUNKS:
+            raise ValueError(f"At most {BATCH_MAX_CHUNKS} chunks per batch")
+        return [(cx, cy, cz) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) for cz in range(z0, z1 + 1)]
+    coords = [tuple(int(v) for v in c) for c in json.loads(request.args.get('chunks', '[]'))]
+    if not coords or any(len(c) != 3 for c in coords):
+        raise ValueError("Provide chunks=[[cx, cy, cz], ...] or box=[x0, y0, z0, x1, y1, z1]")
+    return coords
+@app.route('/api/chunks3d', methods=['GET'])
+def api_generate_3d_chunks():
+    try:
+        seed = request.args.get('seed', 'default_seed')
+        size = min(int(request.args.get('size', 32)), 128)
+        coords = parse_chunk_coords()
+        x_offset = int(request.args.get('x_offset', 0))
+        y_offset = int(request.args.get('y_offset', 0))
+        z_offset = int(request.args.get('z_offset', 0))
+        prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
+        allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
+        use_vein_bias = request.args.get('use_vein_bias', 'True').lower() == 'true'
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        parallel = request.args.get('parallel', 'false').lower() == 'true'
+        model = probability_model(prob_offsets, allowed)
+        binary = wants_binary_chunk()
+        max_voxels = BATCH_MAX_TOTAL_VOXELS if binary else BATCH_MAX_JSON_VOXELS
+        mode, chunks = generate_chunk_batch(seed, size, coords, x_offset, y_offset, z_offset, model, use_vein_bias, noise, parallel, max_voxels)
+        if binary:
+            body = chunk_codec.encode_batch(coords, chunks, model.mineral_tables.names, request.args.get('encoding', 'raw'))
+            return Response(body, mimetype=chunk_codec.MIME_TYPE, headers={'X-Vein-Bias': mode})
+        return jsonify({
+            'vein_bias': mode,
+            'chunks': [
+                {'chunk_x': c[0], 'chunk_y': c[1], 'chunk_z': c[2], 'chunk': ids_to_names(ids, model.mineral_tables)}
+                for c, ids in zip(coords, chunks)
+            ]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+def reload_mineral_tables():
+    """
+    Re-read minerals.json and swap in the new tables (a no-op if the document is unchanged). Returns whether they changed.
+    A file that fails to parse or validate leaves the current tables in place and is reported in CATALOG_STATE.
+    """
+    with TABLES_LOCK:
+        old = TABLES
+        try:
+            CATALOG_STATE['mtime'] = os.stat(MINERALS_PATH).st_mtime_ns
+            tables = load_mineral_tables(MINERALS_PATH, old.version + 1)
+        except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+            CATALOG_STATE['last_error'] = f"{type(e).__name__}: {e}"
+            print(f"Keeping minerals.json version {old.version}: {CATALOG_STATE['last_error']}")
+            return False
+        CATALOG_STATE['last_error'] = None
+        if tables.minerals_data == old.minerals_data:
+            return False
+        install_mineral_tables(tables)
+        CATALOG_STATE['loaded_at'] = time.time()
+        if tables.generation != old.generation:
+            # Models hold their own tables, so in-flight requests finish on the old ones; new requests compile afresh
+            compile_model_for_tables.cache_clear() # Drops the old tables' models; lookups are keyed on the tables anyway
+            dropped = SLICE_CACHE.invalidate(lambda key: key[-1] != tables.generation)
+            if tables.id_generation != old.id_generation: # Colour and cover edits keep every chunk (and the chunk store) valid
+                retire_pool()
+                dropped += CHUNK_CACHE.invalidate(lambda key: key[-1] != tables.id_generation)
+            GEO_CACHE.purge('offsets') # Stored offsets carry mineral boosts and a cover variant from the old document
+            print(f"minerals.json version {tables.version}: generation {old.generation} -> {tables.generation}, {dropped} cached entries dropped")
+        else:
+            print(f"minerals.json version {tables.version}: generation unchanged, caches kept")
+        return True
+def watch_mineral_tables():
+    while True:
+        time.sleep(CATALOG_WATCH_INTERVAL)
+        try:
+            changed = os.stat(MINERALS_PATH).st_mtime_ns != CATALOG_STATE['mtime']
+        except OSError:
+            continue
+        if changed:
+            reload_mineral_tables()
+CATALOG_WATCHER = None
+@app.before_request
+def start_catalog_watcher():
+    # Started with the first request rather than at import, so pool workers importing this module never poll
+    global CATALOG_WATCHER
+    if CATALOG_WATCHER is None and CATALOG_WATCH_INTERVAL > 0:
+        with TABLES_LOCK:
+            if CATALOG_WATCHER is None:
+                CATALOG_WATCHER = threading.Thread(target=watch_mineral_tables, name='minerals-watcher', daemon=True)
+                CATALOG_WATCHER.start()
+def admin_authorized():
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return (address.ipv4_mapped or address).is_loopback if address.version == 6 else address.is_loopback
+def catalog_status():
+    return {
+        'path': MINERALS_PATH,
+        'version': TABLES.version,
+        'generation': TABLES.generation,
+        'id_generation': TABLES.id_generation,
+        'catalog_version': CATALOG.version,
+        'minerals': len(TABLES.names) - 1,
+        'loaded_at': CATALOG_STATE['loaded_at'],
+        'last_error': CATALOG_STATE['last_error'],
+        'watch_interval': CATALOG_WATCH_INTERVAL
+    }
+@app.route('/api/admin/catalog', methods=['GET'])
+def api_catalog_status():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(catalog_status())
+@app.route('/api/admin/catalog/reload', methods=['POST'])
+def api_catalog_reload():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    changed = reload_mineral_tables()
+    return jsonify(dict(catalog_status(), changed=changed)), 200 if CATALOG_STATE['last_error'] is None else 422
+@app.route('/api/admin/geo_cache', methods=['GET'])
+def api_geo_cache_stats():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(dict(GEO_CACHE.stats(), upstream=UPSTREAM.stats()))
+@app.route('/api/admin/geo_cache/purge', methods=['POST'])
+def api_geo_cache_purge():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    source = request.args.get('source') or None
+    expired_only = request.args.get('expired_only', 'false').lower() == 'true'
+    return jsonify({'removed': GEO_CACHE.purge(source, expired_only)})
+@app.route('/api/admin/chunk_cache', methods=['GET'])
+def api_chunk_cache_stats():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(CHUNK_CACHE.stats())
+@app.route('/api/admin/chunk_store', methods=['GET'])
+def api_chunk_store_stats():
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(CHUNK_STORE.stats())
 @app.route('/api/slice2d', methods=['GET'])
 def api_generate_2d_slice():
     try:
@@ -563,9 +1317,224 @@ def api_generate_2d_slice():
         y_offset = int(request.args.get('y_offset', 0))
         prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
         allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
-        slice_data = generate_2d_slice(seed, size, z, x_offset, y_offset, prob_offsets, allowed)
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        slice_data = generate_2d_slice(seed, size, z, x_offset, y_offset, prob_offsets, allowed, noise)
         return jsonify(slice_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+@app.route('/api/section', methods=['GET'])
+def api_section():
+    try:
+        seed = request.args.get('seed', 'default_seed')
+        plane = request.args.get('plane', 'xz')
+        width = int(request.args.get('width', 128))
+        height = int(request.args.get('height', 128))
+        if width < 1 or height < 1 or width * height > SECTION_MAX_POINTS:
+            raise ValueError(f"width x height must be between 1 and {SECTION_MAX_POINTS}")
+        x_offset = int(request.args.get('x_offset', 0))
+        y_offset = int(request.args.get('y_offset', 0))
+        z_offset = int(request.args.get('z_offset', 0))
+        if plane == 'oblique':
+            plane_args = {
+                'origin': json.loads(request.args.get('origin', '[0, 0, 0]')),
+                'u_axis': json.loads(request.args.get('u', '[1, 0, 0]')),
+                'v_axis': json.loads(request.args.get('v', '[0, 0, 1]'))
+            }
+        else:
+            plane_args = {'at': int(request.args.get('at', 0))}
+        prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
+        allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        model = probability_model(prob_offsets, allowed)
+        ids = generate_section_ids(seed, plane, width, height, x_offset, y_offset, z_offset, model, noise, **plane_args)
+        if request.args.get('format') == 'png':
+            return Response(encode_indexed_png(ids, model.mineral_tables.palette), mimetype='image/png')
+        return jsonify({'plane': plane, 'width': width, 'height': height, 'section': ids_to_names(ids, model.mineral_tables)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+@app.route('/api/borehole', methods=['GET'])
+def api_borehole():
+    try:
+        seed = request.args.get('seed', 'default_seed')
+        x = int(request.args.get('x', 0))
+        y = int(request.args.get('y', 0))
+        z_top = int(request.args.get('z_top', 0))
+        depth = int(request.args.get('depth', 256))
+        if not (1 <= depth <= SECTION_MAX_POINTS):
+            raise ValueError(f"depth must be between 1 and {SECTION_MAX_POINTS}")
+        x_offset = int(request.args.get('x_offset', 0))
+        y_offset = int(request.args.get('y_offset', 0))
+        z_offset = int(request.args.get('z_offset', 0))
+        prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
+        allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        model = probability_model(prob_offsets, allowed)
+        ids = generate_borehole_ids(seed, x, y, z_top, depth, x_offset, y_offset, z_offset, model, noise)
+        return jsonify({
+            'x': x,
+            'y': y,
+            'z_top': z_top,
+            'depth': depth,
+            'column': ids_to_names(ids, model.mineral_tables),
+            'intervals': borehole_intervals(ids, z_top, model.mineral_tables)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    try:
+        seed = request.args.get('seed', 'default_seed')
+        box = [int(v) for v in json.loads(request.args.get('box', '[0, 0, 0, 32, 32, 32]'))]
+        if len(box) != 6:
+            raise ValueError("box must be [x0, y0, z0, x1, y1, z1]")
+        offsets = [int(request.args.get(k, 0)) for k in ('x_offset', 'y_offset', 'z_offset')]
+        box = [v + offsets[i % 3] for i, v in enumerate(box)]
+        samples = min(int(request.args.get('samples', STATS_DEFAULT_SAMPLES)), STATS_MAX_SAMPLES)
+        prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
+        allowed = json.loads(request.args.get('allowed_minerals', '[]')) or None
+        use_vein_bias = request.args.get('use_vein_bias', 'True').lower() == 'true'
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        return jsonify(region_stats(seed, box, probability_model(prob_offsets, allowed), use_vein_bias, noise, samples))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+def mined_chunk(params):
+    """(size, store key) of the chunk addressed by seed/size/chunk_x..z/x_offset..z_offset in a request's args or JSON body"""
+    size = min(int(params.get('size', 32)), 128)
+    origin = [int(params.get(f'{axis}_offset', 0)) + size * int(params.get(f'chunk_{axis}', 0)) for axis in 'xyz']
+    return size, mined_chunk_key(params.get('seed', 'default_seed'), size, *origin)
+def default_cover_variant(seed):
+    """Stable per-seed cover when the client has none from /api/offsets"""
+    ids = [variant['id'] for variant in minerals_data['coverVariants']]
+    if not ids:
+        return 'clayey_mudflat'
+    return ids[int.from_bytes(hashlib.sha256(seed.encode()).digest()[:4], 'big') % len(ids)]
+@app.route('/api/mined', methods=['GET'])
+def api_get_mined():
+    try:
+        size, key = mined_chunk(request.args)
+        version, indices, full = MINED_STORE.read(key, int(request.args.get('since', 0)))
+        return jsonify({
+            'version': version,
+            'full': full, # False: 'mined' only holds voxels mined after `since`
+            'count': int(indices.size),
+            'encoding': request.args.get('encoding', 'rle'),
+            'mined': encode_index_set(indices, size ** 3, request.args.get('encoding', 'rle'))
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+@app.route('/api/mined', methods=['POST'])
+def api_post_mined():
+    try:
+        body = request.get_json(force=True) or {}
+        size, key = mined_chunk(body)
+        voxels = np.asarray(body.get('voxels', []), dtype=np.int64).reshape(-1, 3)
+        if ((voxels < 0) | (voxels >= size)).any():
+            raise ValueError("voxels must be [x, y, z] inside the chunk")
+        indices = (voxels[:, 0] * size + voxels[:, 1]) * size + voxels[:, 2]
+        version, added = MINED_STORE.mine(key, indices)
+        return jsonify({'version': version, 'added': added})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+@app.route('/api/mined', methods=['DELETE'])
+def api_reset_mined():
+    try:
+        _, key = mined_chunk(request.args)
+        return jsonify({'version': MINED_STORE.reset(key)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+@app.route('/api/cover', methods=['GET'])
+def api_cover():
+    """Cover layer of a chunk: the top `depth` z-planes start covered; mined voxels there are uncovered"""
+    try:
+        size, key = mined_chunk(request.args)
+        depth = max(0, min(int(request.args.get('depth', 1)), size))
+        cover_variant = request.args.get('cover_variant') or default_cover_variant(request.args.get('seed', 'default_seed'))
+        encoding = request.args.get('encoding', 'rle')
+        version, mined, _ = MINED_STORE.read(key)
+        uncovered = mined[mined % size < depth]
+        # Leading cover planes with every voxel mined; once all are gone nothing above size is covered
+        per_plane = np.bincount(uncovered % size, minlength=depth)[:depth]
+        cleared = int(np.argmin(per_plane == size * size)) if (per_plane < size * size).any() else depth
+        since = int(request.args.get('since', 0))
+        full = True
+        if since:
+            _, delta, full = MINED_STORE.read(key, since)
+            if not full:
+                uncovered = delta[delta % size < depth]
+        return jsonify({
+            'cover_variant': cover_variant,
+            'cover': f'cover_{cover_variant}',
+            'depth': depth,
+            'version': version,
+            'full': full,
+            'encoding': encoding,
+            'uncovered': encode_index_set(uncovered, size ** 3, encoding),
+            'max_mined_depth': size if cleared == depth else cleared
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+def catalog_response(body):
+    """Precompressed EncodedBody with strong ETags: 304 on a match, immutable caching when the URL pins the version"""
+    encoding, data = body.negotiate(request.headers.get('Accept-Encoding'))
+    if any(request.if_none_match.contains(etag) for etag in body.etags()):
+        resp = Response(status=304)
+    else:
+        resp = Response(data, mimetype='application/json')
+        if encoding != 'identity':
+            resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(body.etag_for(encoding))
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if request.args.get('v') == CATALOG.version:
+        resp.headers['Cache-Control'] = f'public, max-age={CATALOG_IMMUTABLE_AGE}, immutable'
+    else:
+        resp.headers['Cache-Control'] = 'public, no-cache' # Revalidate every time; unchanged catalogs answer 304
+    return resp
+@app.route('/api/catalog/render', methods=['GET'])
+def api_catalog_render():
+    resp = catalog_response(CATALOG.render)
+    resp.headers['X-Catalog-Version'] = CATALOG.version
+    return resp
+@app.route('/api/catalog/minerals/<name>', methods=['GET'])
+def api_catalog_mineral(name):
+    body = CATALOG.detail(name)
+    if body is None:
+        return jsonify({'error': f'Unknown mineral: {name}'}), 404
+    return catalog_response(body)
+@app.route('/api/slice.png', methods=['GET'])
+def api_slice_png():
+    try:
+        seed = request.args.get('seed', 'default_seed')
+        size = int(request.args.get('size', 256))
+        z = int(request.args.get('z', 0))
+        x_offset = int(request.args.get('x_offset', 0))
+        y_offset = int(request.args.get('y_offset', 0))
+        zoom = int(request.args.get('zoom', 1))
+        if not (1 <= size <= SLICE_MAX_SIZE) or not (1 <= zoom <= size):
+            raise ValueError(f"size must be 1-{SLICE_MAX_SIZE} and zoom 1-size")
+        prob_offsets = json.loads(request.args.get('prob_offsets', '{}'))
+        noise = resolve_noise_backend(seed, request.args.get('noise'))
+        model = probability_model(prob_offsets)
+        etag = slice_etag(seed, size, z, x_offset, y_offset, zoom, model, noise)
+        if request.if_none_match.contains(etag): # Revalidation costs no rendering
+            resp = Response(status=304)
+        else:
+            resp = Response(render_slice_png(seed, size, z, x_offset, y_offset, zoom, model, noise, etag), mimetype='image/png')
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache' # Always revalidate; the ETag makes that a 304
+        return resp
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+# Background warmup so the first request finds the plate index and default model ready (never in pool workers)
+WARMUP = os.environ.get('LITHOS_WARMUP', 'true').lower() == 'true'
+def warm_up():
+    start = time.time()
+    get_plate_index()
+    compile_probability_model()
+    print(f"Warmup done in {time.time() - start:.3f}s ({'snapshot' if SNAPSHOT is not None else 'source files'})")
+# Spawned/forkserver workers import this module while unpickling their first task, before parent_process() is set;
+# multiprocessing flags that bootstrap with _inheriting
+IN_WORKER = multiprocessing.parent_process() is not None or getattr(multiprocessing.current_process(), '_inheriting', False)
+if WARMUP and not IN_WORKER:
+    threading.Thread(target=warm_up, name='warmup', daemon=True).start()
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,70 @@
+"""
+Projections of minerals.json served to the frontend instead of the whole document.
+The render projection keeps what drawing needs (colours, layer probabilities, vein boosts, texture maps) in the
+same {"minerals": {...}, "coverVariants": [...]} shape as minerals.json; the detail projection is one mineral's full
+entry, built on first request. Every body is serialized once, tagged with a strong ETag (sha256 of the bytes) and
+precompressed with gzip and, when the optional brotli package is installed, brotli.
+"""
+import gzip
+import hashlib
+import json
+import threading
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip and identity are offered
+    brotli = None
+RENDER_FIELDS = ('id', 'name', 'color', 'prob_layers', 'vein_boost_layers', 'texture', 'normalMap', 'roughnessMap', 'emissiveMap', 'roughness', 'metalness')
+COVER_DROP_FIELDS = ('conditions',) # Matching happens on the server
+class EncodedBody:
+    """One JSON document, precompressed, with a strong ETag per encoding"""
+    def __init__(self, document):
+        data = json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        self.bodies = {'identity': data, 'gzip': gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(data, quality=11)
+    def etag_for(self, encoding):
+        return self.etag if encoding == 'identity' else f"{self.etag}-{encoding}"
+    def etags(self):
+        return [self.etag_for(encoding) for encoding in self.bodies]
+    def negotiate(self, accept_encoding):
+        """(encoding, body) for an Accept-Encoding header: brotli, then gzip, then identity"""
+        offered = set()
+        for part in (accept_encoding or '').split(','):
+            name, _, params = part.partition(';')
+            q = params.replace(' ', '').partition('q=')[2]
+            try:
+                if q and float(q) == 0:
+                    continue # Explicitly refused
+            except ValueError:
+                pass
+            offered.add(name.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in offered and encoding in self.bodies:
+                return encoding, self.bodies[encoding]
+        return 'identity', self.bodies['identity']
+class Catalog:
+    def __init__(self, minerals_data):
+        self.minerals_data = minerals_data
+        self.render = EncodedBody({
+            'minerals': {
+                name: {field: entry[field] for field in RENDER_FIELDS if field in entry}
+                for name, entry in minerals_data['minerals'].items()
+            },
+            'coverVariants': [
+                {k: v for k, v in variant.items() if k not in COVER_DROP_FIELDS}
+                for variant in minerals_data['coverVariants']
+            ]
+        })
+        self.details = {}
+        self.lock = threading.Lock()
+    @property
+    def version(self):
+        return self.render.etag
+    def detail(self, name):
+        """EncodedBody of one mineral's full entry, or None for an unknown mineral"""
+        with self.lock:
+            body = self.details.get(name)
+            if body is None and name in self.minerals_data['minerals']:
+                body = self.details[name] = EncodedBody(self.minerals_data['minerals'][name])
+            return body
@@ -0,0 +1,61 @@
+"""
+Chunk-level LRU cache for generated mineral-id arrays, bounded by total bytes rather than entry count.
+Keys are built by the caller, e.g. (seed, noise, (x, y, z) origin, size, model fingerprint, vein-bias flag).
+"""
+import threading
+from collections import OrderedDict
+class ChunkCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> read-only np.ndarray, least recently used first
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    def get(self, key):
+        with self.lock:
+            ids = self.entries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ids
+    def put(self, key, ids):
+        """Store ids (frozen, so cached arrays can be shared between requests) and evict down to max_bytes"""
+        if ids.nbytes > self.max_bytes:
+            return ids
+        ids.flags.writeable = False
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self.entries[key] = ids
+            self.current_bytes += ids.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+        return ids
+    def invalidate(self, predicate):
+        """Drop the entries whose key satisfies predicate(key); returns how many were dropped"""
+        with self.lock:
+            stale = [key for key in self.entries if predicate(key)]
+            for key in stale:
+                self.current_bytes -= self.entries.pop(key).nbytes
+        return len(stale)
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
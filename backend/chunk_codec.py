@@ -0,0 +1,146 @@
+"""
+Compact binary chunk format for /api/chunk3d (format=bin or Accept: application/x-lithos-chunk).
+
+All integers are little-endian.
+    magic       4 bytes   b'LTHC'
+    version     u8        1
+    encoding    u8        0 = raw, 1 = run-length, 2 = deflate (zlib stream of the raw ids)
+    dims        3 x u16   nx, ny, nz
+    palette     u8 count, then per entry: u8 byte length + UTF-8 mineral name (entry i is id i)
+    payload     nx*ny*nz ids in [x][y][z] order (z fastest), same nesting as the JSON 'chunk'
+                raw:     u8[nx*ny*nz]
+                rle:     u32 run count n, u32[n] run lengths, u8[n] run ids
+                deflate: zlib data that inflates to the raw payload
+Batches (/api/chunks3d) wrap several payloads, see encode_batch.
+Surfaces (/api/chunk3d?surface=...) use their own header and store columns of u8, see encode_surface.
+"""
+import struct
+import zlib
+import numpy as np
+MAGIC = b'LTHC'
+VERSION = 1
+MIME_TYPE = 'application/x-lithos-chunk'
+ENCODINGS = {'raw': 0, 'rle': 1, 'deflate': 2}
+DEFLATE_LEVEL = 1 # Nearly the ratio of level 6 at a fraction of the time for noise-like chunks
+SURFACE_MAGIC = b'LTHS'
+SURFACE_COLUMNS = {'voxels': ('x', 'y', 'z', 'id', 'faces'), 'quads': ('face', 'x', 'y', 'z', 'du', 'dv', 'id')}
+def run_lengths(flat):
+    """Run lengths and run values of a flat uint8 array"""
+    if flat.size == 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8)
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    lengths = np.diff(np.append(starts, flat.size))
+    return lengths.astype(np.uint32), flat[starts]
+def encode_palette(palette):
+    if len(palette) > 255:
+        raise ValueError("Palette too large for uint8 ids")
+    parts = [struct.pack('<B', len(palette))]
+    for name in palette:
+        encoded = name.encode('utf-8')
+        parts.append(struct.pack('<B', len(encoded)) + encoded)
+    return b''.join(parts)
+def decode_palette(data, pos):
+    """(palette, position after it)"""
+    count = data[pos]
+    pos += 1
+    palette = []
+    for _ in range(count):
+        length = data[pos]
+        palette.append(data[pos + 1:pos + 1 + length].decode('utf-8'))
+        pos += 1 + length
+    return palette, pos
+def encode_header(shape, palette, encoding='raw'):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown chunk encoding: {encoding}")
+    return MAGIC + struct.pack('<BB3H', VERSION, ENCODINGS[encoding], *shape) + encode_palette(palette)
+def encode_chunk(ids, palette, encoding='raw'):
+    """Serialize a 3-D uint8 id array and its palette (list of names) to bytes"""
+    header = encode_header(ids.shape, palette, encoding)
+    flat = np.ascontiguousarray(ids, dtype=np.uint8).ravel()
+    if encoding == 'raw':
+        return header + flat.tobytes()
+    if encoding == 'rle':
+        lengths, values = run_lengths(flat)
+        return header + struct.pack('<I', lengths.size) + lengths.astype('<u4').tobytes() + values.tobytes()
+    return header + zlib.compress(flat.tobytes(), DEFLATE_LEVEL)
+def decode_chunk(data):
+    """Inverse of encode_chunk: returns (ids, palette)"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a chunk payload")
+    version, encoding, nx, ny, nz = struct.unpack_from('<BB3H', data, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported chunk version: {version}")
+    palette, pos = decode_palette(data, 12)
+    payload = data[pos:]
+    if encoding == ENCODINGS['raw']:
+        flat = np.frombuffer(payload, dtype=np.uint8)
+    elif encoding == ENCODINGS['rle']:
+        runs = struct.unpack_from('<I', payload)[0]
+        lengths = np.frombuffer(payload, dtype='<u4', count=runs, offset=4)
+        values = np.frombuffer(payload, dtype=np.uint8, count=runs, offset=4 + 4 * runs)
+        flat = np.repeat(values, lengths)
+    else:
+        flat = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+    return flat.reshape((nx, ny, nz)), palette
+def encode_batch(coords, chunks, palette, encoding='raw'):
+    """Several chunks in one body: u16 count, then per chunk 3 x i32 chunk coords, u32 byte length and an encode_chunk payload"""
+    parts = [struct.pack('<H', len(chunks))]
+    for c, ids in zip(coords, chunks):
+        payload = encode_chunk(ids, palette, encoding)
+        parts.append(struct.pack('<3iI', *c, len(payload)) + payload)
+    return b''.join(parts)
+def decode_batch(data):
+    """Inverse of encode_batch: returns a list of ((cx, cy, cz), ids, palette)"""
+    count = struct.unpack_from('<H', data)[0]
+    pos = 2
+    out = []
+    for _ in range(count):
+        cx, cy, cz, length = struct.unpack_from('<3iI', data, pos)
+        pos += 16
+        ids, palette = decode_chunk(data[pos:pos + length])
+        out.append(((cx, cy, cz), ids, palette))
+        pos += length
+    return out
+def iter_encode_chunk(shape, slabs, palette, encoding='raw'):
+    """Streaming encode_chunk over [x] slabs (raw or deflate only); arguments are checked before the first byte"""
+    if encoding == 'rle':
+        raise ValueError("rle needs the whole chunk up front; stream with raw or deflate")
+    header = encode_header(shape, palette, encoding)
+    def generate():
+        yield header
+        compressor = zlib.compressobj(DEFLATE_LEVEL) if encoding == 'deflate' else None
+        for slab in slabs:
+            data = np.ascontiguousarray(slab, dtype=np.uint8).tobytes()
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+    return generate()
+def encode_surface(kind, shape, columns, palette):
+    """
+    Surface body: magic b'LTHS', u8 version, u8 kind (0 = voxels, 1 = quads), 3 x u16 dims, palette as in encode_header,
+    u32 count, then each of SURFACE_COLUMNS[kind] as u8[count] in that order (coordinates and extents fit u8 up to 255)
+    """
+    names = SURFACE_COLUMNS[kind]
+    count = len(columns[names[0]])
+    parts = [SURFACE_MAGIC, struct.pack('<BB3H', VERSION, list(SURFACE_COLUMNS).index(kind), *shape), encode_palette(palette), struct.pack('<I', count)]
+    parts.extend(np.asarray(columns[name]).astype(np.uint8).tobytes() for name in names)
+    return b''.join(parts)
+def decode_surface(data):
+    """Inverse of encode_surface: returns (kind, shape, columns, palette)"""
+    if data[:4] != SURFACE_MAGIC:
+        raise ValueError("Not a surface payload")
+    version, kind_index, nx, ny, nz = struct.unpack_from('<BB3H', data, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported surface version: {version}")
+    kind = list(SURFACE_COLUMNS)[kind_index]
+    palette, pos = decode_palette(data, 12)
+    count = struct.unpack_from('<I', data, pos)[0]
+    pos += 4
+    columns = {}
+    for name in SURFACE_COLUMNS[kind]:
+        columns[name] = np.frombuffer(data, dtype=np.uint8, count=count, offset=pos)
+        pos += count
+    return kind, (nx, ny, nz), columns, palette
@@ -0,0 +1,104 @@
+"""
+On-disk store of pre-generated chunks, served through memory maps.
+A "world" is everything that fixes a chunk's contents apart from its position: (seed, noise backend, size, model
+fingerprint, vein-bias flag). Each world has one tile file of fixed-size slots (size^3 uint8 ids, [x][y][z] order)
+and a SQLite index from global chunk origin to slot. Readers map the tile file read-only and hand out views of a slot,
+so chunks are never copied into process memory and every worker process shares the same pages of the OS page cache.
+Writers append the slot data first and commit the index row after, so readers never see a half-written chunk. Replacing a
+chunk appends a new slot too and repoints the row; the old slot is left in place (views handed out may still read it).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+def world_key(seed, noise, size, fingerprint, use_vein_bias):
+    return hashlib.sha256(repr((seed, noise, size, fingerprint, bool(use_vein_bias))).encode()).hexdigest()[:32]
+class ChunkStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.maps = {} # world -> read-only np.memmap of its tile file (remapped when the file has grown)
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL') # Several workers (and a populating CLI) share the index
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS worlds ('
+            'world TEXT PRIMARY KEY, seed TEXT NOT NULL, noise TEXT NOT NULL, size INTEGER NOT NULL, '
+            'fingerprint TEXT NOT NULL, vein_bias INTEGER NOT NULL, created REAL NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS chunks ('
+            'world TEXT NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL, z INTEGER NOT NULL, slot INTEGER NOT NULL, '
+            'PRIMARY KEY (world, x, y, z))'
+        )
+        self.conn.commit()
+    def tile_path(self, world):
+        return os.path.join(self.root, world + '.tiles')
+    def _slot(self, world, x0, y0, z0):
+        row = self.conn.execute('SELECT slot FROM chunks WHERE world = ? AND x = ? AND y = ? AND z = ?', (world, x0, y0, z0)).fetchone()
+        return row[0] if row else None
+    def _map(self, world, end):
+        """Memory map of the world's tile file covering at least `end` bytes"""
+        tiles = self.maps.get(world)
+        if tiles is None or tiles.size < end:
+            # In-flight views keep the previous map alive until they are released
+            tiles = self.maps[world] = np.memmap(self.tile_path(world), dtype=np.uint8, mode='r')
+        return tiles
+    def get(self, seed, noise, size, fingerprint, use_vein_bias, x0, y0, z0):
+        """Read-only (size, size, size) view of a stored chunk, or None"""
+        world = world_key(seed, noise, size, fingerprint, use_vein_bias)
+        slot_bytes = size ** 3
+        with self.lock:
+            slot = self._slot(world, x0, y0, z0)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            tiles = self._map(world, (slot + 1) * slot_bytes)
+        return tiles[slot * slot_bytes:(slot + 1) * slot_bytes].reshape(size, size, size)
+    def contains(self, seed, noise, size, fingerprint, use_vein_bias, x0, y0, z0):
+        with self.lock:
+            return self._slot(world_key(seed, noise, size, fingerprint, use_vein_bias), x0, y0, z0) is not None
+    def put(self, seed, noise, size, fingerprint, use_vein_bias, x0, y0, z0, ids):
+        """Store a (size, size, size) uint8 chunk in a fresh slot (replacing any stored one at that origin); returns the slot"""
+        ids = np.ascontiguousarray(ids, dtype=np.uint8)
+        if ids.shape != (size, size, size):
+            raise ValueError(f"Expected a {size}^3 chunk, got {ids.shape}")
+        world = world_key(seed, noise, size, fingerprint, use_vein_bias)
+        with self.lock:
+            # The write transaction also serializes slot allocation between processes
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO worlds (world, seed, noise, size, fingerprint, vein_bias, created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (world, seed, noise, size, fingerprint, int(bool(use_vein_bias)), time.time())
+                )
+                # Always past every indexed slot, never over one in place: a reader may hold a view of the chunk being replaced
+                slot = self.conn.execute('SELECT COALESCE(MAX(slot) + 1, 0) FROM chunks WHERE world = ?', (world,)).fetchone()[0]
+                fd = os.open(self.tile_path(world), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    os.pwrite(fd, ids.data, slot * ids.nbytes)
+                finally:
+                    os.close(fd)
+                self.conn.execute('INSERT OR REPLACE INTO chunks (world, x, y, z, slot) VALUES (?, ?, ?, ?, ?)', (world, x0, y0, z0, slot))
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return slot
+    def stats(self):
+        with self.lock:
+            worlds = self.conn.execute(
+                'SELECT w.seed, w.noise, w.size, w.vein_bias, COUNT(c.slot) FROM worlds w LEFT JOIN chunks c ON c.world = w.world GROUP BY w.world'
+            ).fetchall()
+            return {
+                'root': self.root,
+                'worlds': [{'seed': s, 'noise': n, 'size': size, 'vein_bias': bool(b), 'chunks': count} for s, n, size, b, count in worlds],
+                'bytes': sum(size ** 3 * count for _, _, size, _, count in worlds),
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,65 @@
+"""
+Cover-variant matching compiled once from the coverVariants list in minerals.json.
+Numeric thresholds become arrays (NaN where a variant has no such condition) and the natural/landuse/crust lists
+become membership matrices over a small vocabulary, so many locations are scored against every variant in one
+NumPy pass. Scores and tie-breaking (first variant with the highest score, in document order) are the same as the
+original per-variant match_variant loop.
+"""
+import numpy as np
+DEFAULT_VARIANT = 'clayey_mudflat' # Returned when there are no variants at all
+# Points per satisfied condition
+ELEVATION_POINTS = 1
+FLAG_POINTS = 2 # requires_tropical / requires_cold
+TAG_POINTS = 2 # natural / landuse / crust_types
+TROPICAL_LAT = 30
+COLD_LAT = 50
+COLD_ELEVATION = 2000
+class CoverRuleTable:
+    def __init__(self, variants):
+        self.ids = [variant['id'] for variant in variants]
+        conditions = [variant.get('conditions', {}) for variant in variants]
+        self.elevation_min = np.array([c.get('elevation_min', np.nan) for c in conditions], dtype=np.float64)
+        self.elevation_max = np.array([c.get('elevation_max', np.nan) for c in conditions], dtype=np.float64)
+        self.tropical = np.array([bool(c.get('requires_tropical')) for c in conditions])
+        self.cold = np.array([bool(c.get('requires_cold')) for c in conditions])
+        self.tags = {
+            'natural': self._membership([{n.lower() for n in c['natural']} if 'natural' in c else set() for c in conditions]),
+            'landuse': self._membership([{l.lower() for l in c['landuse']} if 'landuse' in c else set() for c in conditions]),
+            'crust_type': self._membership([set(c['crust_types']) if 'crust_types' in c else set() for c in conditions])
+        }
+    @staticmethod
+    def _membership(sets):
+        """(vocabulary {value: column}, bool matrix [value column, variant]) with a trailing all-False row for unknown values"""
+        vocab = {value: i for i, value in enumerate(sorted(set().union(*sets)))}
+        matrix = np.zeros((len(vocab) + 1, len(sets)), dtype=bool)
+        for j, values in enumerate(sets):
+            for value in values:
+                matrix[vocab[value], j] = True
+        return vocab, matrix
+    def _tag_hits(self, key, values):
+        vocab, matrix = self.tags[key]
+        unknown = len(vocab)
+        return matrix[np.array([vocab.get(v, unknown) for v in values], dtype=np.intp)]
+    def scores(self, elevations, lats, naturals, landuses, crust_types):
+        """Score matrix [location, variant]; naturals/landuses are expected lowercased, as get_offsets_from_location builds them"""
+        elevation = np.asarray(elevations, dtype=np.float64)[:, None]
+        abs_lat = np.abs(np.asarray(lats, dtype=np.float64))[:, None]
+        with np.errstate(invalid='ignore'):
+            score = ELEVATION_POINTS * (elevation >= self.elevation_min).astype(np.int32)
+            score += ELEVATION_POINTS * (elevation <= self.elevation_max)
+        score += FLAG_POINTS * (self.tropical & (abs_lat <= TROPICAL_LAT))
+        score += FLAG_POINTS * (self.cold & ((abs_lat >= COLD_LAT) | (elevation >= COLD_ELEVATION)))
+        score += TAG_POINTS * self._tag_hits('natural', naturals)
+        score += TAG_POINTS * self._tag_hits('landuse', landuses)
+        score += TAG_POINTS * self._tag_hits('crust_type', crust_types)
+        return score
+    def classify(self, elevations, lats, naturals, landuses, crust_types):
+        """Best cover variant id per location (argmax keeps the first of equal scores, i.e. document order)"""
+        if not self.ids:
+            return [DEFAULT_VARIANT] * len(elevations)
+        best = self.scores(elevations, lats, naturals, landuses, crust_types).argmax(axis=1)
+        return [self.ids[i] for i in best]
+    def match(self, location_data):
+        """Best cover variant id for one location_data dict (elevation, lat, natural, landuse, crust_type)"""
+        d = location_data
+        return self.classify([d['elevation']], [d['lat']], [d['natural']], [d['landuse']], [d['crust_type']])[0]
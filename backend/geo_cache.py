@@ -0,0 +1,101 @@
+"""
+Persistent cache for upstream geology lookups (Nominatim, Open-Elevation, MRDS, Mindat), stored in SQLite.
+Entries are keyed by (source, normalized key) and expire after a per-source TTL. Failed lookups are cached too
+(value None, shorter TTL) so a location that keeps failing doesn't pay the upstream timeout on every request.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+DAY = 24 * 60 * 60
+# Time to live per source, in seconds
+SOURCE_TTLS = {
+    'nominatim_search': 30 * DAY,
+    'nominatim_reverse': 30 * DAY,
+    'elevation': 365 * DAY,
+    'mrds': 30 * DAY,
+    'mindat_localities': 7 * DAY,
+    'mindat_minerals': 30 * DAY,
+    'offsets': 30 * DAY # Final /api/offsets answers, keyed by the exact location string
+}
+DEFAULT_TTL = 7 * DAY
+NEGATIVE_TTL = 10 * 60 # Failures are retried after ten minutes
+COORD_PRECISION = int(os.environ.get('LITHOS_GEO_CACHE_PRECISION', 4)) # Decimal places of lat/lon in keys (~11 m)
+def location_key(location):
+    """Normalized free-text location: trimmed, lowercased, single spaces"""
+    return ' '.join(location.strip().lower().split())
+def coord_key(lat, lon, precision=None):
+    precision = COORD_PRECISION if precision is None else precision
+    return f"{round(lat, precision):.{precision}f},{round(lon, precision):.{precision}f}"
+def bbox_key(min_lat, max_lat, min_lon, max_lon, precision=None):
+    precision = COORD_PRECISION if precision is None else precision
+    return ','.join(f"{round(v, precision):.{precision}f}" for v in (min_lat, max_lat, min_lon, max_lon))
+class GeoCache:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.conn.execute('PRAGMA journal_mode=WAL') # Several workers can share the file
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'source TEXT NOT NULL, key TEXT NOT NULL, value TEXT, ok INTEGER NOT NULL, '
+            'created REAL NOT NULL, expires REAL NOT NULL, PRIMARY KEY (source, key))'
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+    def get(self, source, key):
+        """(True, value) for a live entry (value is None for a cached failure), else (False, None)"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT value, ok FROM entries WHERE source = ? AND key = ? AND expires > ?',
+                (source, key, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        value, ok = row
+        return True, (json.loads(value) if ok else None)
+    def put(self, source, key, value):
+        """Store a lookup result; None records a failure with the negative TTL"""
+        now = time.time()
+        ok = value is not None
+        ttl = SOURCE_TTLS.get(source, DEFAULT_TTL) if ok else NEGATIVE_TTL
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries (source, key, value, ok, created, expires) VALUES (?, ?, ?, ?, ?, ?)',
+                (source, key, json.dumps(value) if ok else None, int(ok), now, now + ttl)
+            )
+            self.conn.commit()
+    def purge(self, source=None, expired_only=False):
+        """Delete entries (optionally one source, optionally only expired ones); returns the number removed"""
+        clauses, params = [], []
+        if source:
+            clauses.append('source = ?')
+            params.append(source)
+        if expired_only:
+            clauses.append('expires <= ?')
+            params.append(time.time())
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        with self.lock:
+            removed = self.conn.execute('DELETE FROM entries' + where, params).rowcount
+            self.conn.commit()
+        return removed
+    def stats(self):
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT source, COUNT(*), SUM(ok = 0), SUM(expires <= ?) FROM entries GROUP BY source',
+                (time.time(),)
+            ).fetchall()
+            hits, misses = self.hits, self.misses
+        return {
+            'path': self.path,
+            'hits': hits,
+            'misses': misses,
+            'sources': {
+                source: {'entries': count, 'failures': failures or 0, 'expired': expired or 0}
+                for source, count, failures, expired in rows
+            }
+        }
@@ -0,0 +1,124 @@
+"""
+Server-side "mined" state: which voxels of a chunk the player has dug out, stored as an append-only delta log in SQLite.
+Each chunk (seed, size, global origin) has a sequence of versioned rows; a row holds the flat voxel indices
+(x * size^2 + y * size + z, the chunk layout order) mined in one update, or marks a reset. Storage and transfer grow
+with the number of edits, never with the chunk volume. Clients ask for everything after the version they hold.
+"""
+import base64
+import sqlite3
+import threading
+import time
+import numpy as np
+SET_ENCODINGS = ('rle', 'bitset', 'list')
+def chunk_key(seed, size, x0, y0, z0):
+    return f"{seed}|{size}|{x0},{y0},{z0}"
+def encode_index_set(indices, total, encoding='rle'):
+    """
+    JSON-friendly encoding of sorted unique flat indices into range(total).
+    rle: flat [start, length, start, length, ...] runs; bitset: base64 of a little-endian bit per voxel; list: the indices.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if encoding == 'list':
+        return indices.tolist()
+    if encoding == 'bitset':
+        mask = np.zeros(total, dtype=bool)
+        mask[indices] = True
+        return base64.b64encode(np.packbits(mask, bitorder='little').tobytes()).decode('ascii')
+    if encoding != 'rle':
+        raise ValueError(f"Unknown set encoding: {encoding} (use {', '.join(SET_ENCODINGS)})")
+    if indices.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    starts = indices[np.concatenate(([0], breaks))]
+    lengths = np.diff(np.concatenate(([0], breaks, [indices.size])))
+    return np.column_stack([starts, lengths]).ravel().tolist()
+def decode_index_set(data, total, encoding='rle'):
+    """Inverse of encode_index_set: sorted unique flat indices, checked to lie in range(total)"""
+    if encoding == 'bitset':
+        bits = np.unpackbits(np.frombuffer(base64.b64decode(data), dtype=np.uint8), bitorder='little')
+        indices = np.flatnonzero(bits[:total])
+    elif encoding == 'list':
+        indices = np.unique(np.asarray(data, dtype=np.int64))
+    elif encoding == 'rle':
+        runs = np.asarray(data, dtype=np.int64).reshape(-1, 2)
+        # Bounds first, so a client-supplied start or length can't size any allocation
+        if runs.size and ((runs[:, 0] < 0) | (runs[:, 1] < 0) | (runs[:, 0] + runs[:, 1] > total)).any():
+            raise ValueError(f"Runs must be [start, length] pairs inside [0, {total})")
+        # Overlapping runs are fine: coverage counts over range(total) instead of expanding each run
+        coverage = np.zeros(total + 1, dtype=np.int64)
+        np.add.at(coverage, runs[:, 0], 1)
+        np.add.at(coverage, runs[:, 0] + runs[:, 1], -1)
+        indices = np.flatnonzero(np.cumsum(coverage[:total]) > 0)
+    else:
+        raise ValueError(f"Unknown set encoding: {encoding} (use {', '.join(SET_ENCODINGS)})")
+    if indices.size and (indices[0] < 0 or indices[-1] >= total):
+        raise ValueError(f"Indices must lie in [0, {total})")
+    return indices.astype(np.int64)
+class MinedStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS edits ('
+            'chunk TEXT NOT NULL, version INTEGER NOT NULL, indices BLOB, created REAL NOT NULL, '
+            'PRIMARY KEY (chunk, version))' # indices NULL marks a reset
+        )
+        self.conn.commit()
+    def _rows(self, key, since=0):
+        return self.conn.execute(
+            'SELECT version, indices FROM edits WHERE chunk = ? AND version > ? ORDER BY version', (key, since)
+        ).fetchall()
+    def _version(self, key):
+        row = self.conn.execute('SELECT MAX(version) FROM edits WHERE chunk = ?', (key,)).fetchone()
+        return row[0] or 0
+    def read(self, key, since=0):
+        """(version, sorted mined indices, full): everything since the last reset, or only the delta after `since`"""
+        with self.lock:
+            rows = self._rows(key, since)
+            if since > 0 and (any(blob is None for _, blob in rows) or since > self._version(key)):
+                since = 0 # Reset after `since` (or a version this store never issued): the client must replace its state
+                rows = self._rows(key)
+            version = rows[-1][0] if rows else self._version(key)
+        full = since == 0
+        last_reset = max((i for i, (_, blob) in enumerate(rows) if blob is None), default=-1)
+        parts = [np.frombuffer(blob, dtype='<u4') for _, blob in rows[last_reset + 1:]]
+        indices = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+        return version, indices.astype(np.int64), full
+    def mine(self, key, indices):
+        """Append the not-yet-mined indices as a new version; returns (version, number newly mined)"""
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        with self.lock:
+            # The write transaction makes read-max-then-insert atomic between processes sharing the database
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._rows(key)
+                last_reset = max((i for i, (_, blob) in enumerate(rows) if blob is None), default=-1)
+                parts = [np.frombuffer(blob, dtype='<u4') for _, blob in rows[last_reset + 1:]]
+                if parts:
+                    indices = np.setdiff1d(indices, np.concatenate(parts))
+                version = rows[-1][0] if rows else 0
+                if indices.size:
+                    version += 1
+                    self.conn.execute(
+                        'INSERT INTO edits (chunk, version, indices, created) VALUES (?, ?, ?, ?)',
+                        (key, version, indices.astype('<u4').tobytes(), time.time())
+                    )
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return version, int(indices.size)
+    def reset(self, key):
+        """Forget the chunk's edits (logged as a reset row so clients holding older versions resync)"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = self._version(key) + 1
+                self.conn.execute('INSERT INTO edits (chunk, version, indices, created) VALUES (?, ?, NULL, ?)', (key, version, time.time()))
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return version
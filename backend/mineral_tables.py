@@ -0,0 +1,92 @@
+"""
+Everything the backend derives from minerals.json, built in one go so it can be validated and swapped in atomically.
+generation hashes only the data that generation and rendering read (palette, layer probabilities, vein boosts,
+related minerals, colours, cover rules): prose-only edits keep the generation, so cached chunks stay valid across
+a hot reload; anything else bumps it and caches keyed on the old generation are dropped.
+"""
+import hashlib
+import json
+import numpy as np
+from catalog import Catalog
+from cover_rules import CoverRuleTable
+layers_map = {
+    "0-10": (0, 10),
+    "11-35": (11, 35),
+    "36-inf": (36, float('inf'))
+}
+MAX_PALETTE = 255 # uint8 ids, with 255 reserved for "no neighbour" and the slice padding colour
+class StaleTablesError(RuntimeError):
+    """A worker process holds a different table generation than the task it was given"""
+class MineralTables:
+    def __init__(self, minerals_data, version=1):
+        self.minerals_data = minerals_data
+        self.version = version
+        validate_minerals_data(minerals_data)
+        # Build MINERAL_COLORS from JSON
+        self.colors = {
+            'void': (255, 255, 255), # White (porosity)
+            'cover': (165, 42, 42) # Brown for mining cover (fallback, not in JSON)
+        }
+        for name, data in minerals_data['minerals'].items():
+            self.colors[name] = tuple(data['color'])
+        # Build DEPTH_LAYERS from JSON prob_layers
+        self.depth_layers = {}
+        for layer_key, layer_range in layers_map.items():
+            probs = {}
+            for name, data in minerals_data['minerals'].items():
+                prob = data.get('prob_layers', {}).get(layer_key, 0.0)
+                if prob > 0:
+                    probs[name] = prob
+            # Add void probabilities (fixed, as they are not in JSON)
+            probs['void'] = 0.1 if layer_range[0] < 36 else 0.05
+            self.depth_layers[layer_range] = probs
+        # Palette of uint8 mineral ids used by the batched engine (0 is always void)
+        self.names = ['void'] + sorted(name for name in minerals_data['minerals'] if name != 'void')
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.names_array = np.array(self.names, dtype=object)
+        # RGB per mineral id, plus black at pad_color_id for slice padding
+        self.palette = np.array([self.colors[name] for name in self.names] + [(0, 0, 0)], dtype=np.uint8)
+        self.pad_color_id = len(self.names)
+        self.catalog = Catalog(minerals_data)
+        self.cover_rules = CoverRuleTable(minerals_data['coverVariants'])
+        # id_generation covers what decides voxel ids (chunks, the chunk store); generation adds what rendering reads
+        self.id_generation = self._generation(rendering=False)
+        self.generation = self._generation(rendering=True)
+    def _generation(self, rendering):
+        minerals_data = self.minerals_data
+        generation_data = {
+            'names': self.names,
+            'layers': [sorted(probs.items()) for probs in self.depth_layers.values()],
+            'minerals': {
+                name: [data.get('vein_boost_layers'), data.get('related_minerals')] + ([data['color']] if rendering else [])
+                for name, data in sorted(minerals_data['minerals'].items())
+            }
+        }
+        if rendering:
+            generation_data['covers'] = minerals_data['coverVariants']
+        return hashlib.sha256(json.dumps(generation_data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+def validate_minerals_data(minerals_data):
+    """Raise ValueError when a minerals.json document can't drive generation"""
+    if not isinstance(minerals_data, dict) or not isinstance(minerals_data.get('minerals'), dict):
+        raise ValueError("minerals.json needs a 'minerals' object")
+    if not isinstance(minerals_data.get('coverVariants'), list):
+        raise ValueError("minerals.json needs a 'coverVariants' list")
+    if len(minerals_data['minerals']) + 1 > MAX_PALETTE:
+        raise ValueError(f"At most {MAX_PALETTE - 1} minerals fit the uint8 palette")
+    for name, data in minerals_data['minerals'].items():
+        color = data.get('color')
+        if not (isinstance(color, (list, tuple)) and len(color) == 3 and all(isinstance(c, int) and 0 <= c <= 255 for c in color)):
+            raise ValueError(f"{name}: color must be three integers 0-255")
+        for layer_key, prob in (data.get('prob_layers') or {}).items():
+            if not isinstance(prob, (int, float)) or prob < 0:
+                raise ValueError(f"{name}: prob_layers[{layer_key}] must be a non-negative number")
+        for layer_key, boost in (data.get('vein_boost_layers') or {}).items():
+            if boost is not None and not isinstance(boost, (int, float)):
+                raise ValueError(f"{name}: vein_boost_layers[{layer_key}] must be a number")
+    for variant in minerals_data['coverVariants']:
+        if not isinstance(variant, dict) or 'id' not in variant:
+            raise ValueError("Every cover variant needs an id")
+def load_mineral_tables(path, version=1):
+    """MineralTables for the document at path"""
+    with open(path, 'r') as f:
+        return MineralTables(json.load(f), version)
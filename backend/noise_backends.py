@@ -0,0 +1,92 @@
+"""
+Noise backends: map a seed string and integer voxel coordinates to uniforms in [0, 1).
+
+sha256 (legacy, default)
+    u = int.from_bytes(sha256(f"{seed}:{x}:{y}:{z}".encode()).digest()[-8:], 'big') / 2**64
+    Bit-exact with every world generated so far.
+
+splitmix64 (fast, vectorized)
+    All arithmetic is on unsigned 64-bit integers, wrapping modulo 2**64.
+    MASK  = 0xFFFFFFFFFFFFFFFF
+    GAMMA = 0x9E3779B97F4A7C15
+    mix(h):
+        h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK
+        return h ^ (h >> 31)
+    key = int.from_bytes(sha256(seed.encode('utf-8')).digest()[:8], 'big')
+    h = key
+    for c in (x, y, z):                      # c is a signed int, taken as two's complement: c & MASK
+        h = mix(((h + GAMMA) & MASK) ^ (c & MASK))
+    u = (h >> 11) / 2**53                    # top 53 bits, exact as a double
+
+    Porting to JS (e.g. Explorer3D.js): use BigInt and BigInt.asUintN(64, ...) after every + and *,
+    compute key once per seed (SubtleCrypto SHA-256), and return Number(h >> 11n) / 2**53.
+    Reference values for seed 'default_seed':
+        (0, 0, 0)    -> 0.4353954373595803
+        (1, 2, 3)    -> 0.35848842593301544
+        (-1, -2, -3) -> 0.6286092138138601
+
+A backend is picked per request (the `noise` query parameter) or per seed: a seed written as
+"<backend>:<anything>" (e.g. "splitmix64:my_world") uses that backend, with the whole string as the seed.
+"""
+import hashlib
+from functools import lru_cache
+import numpy as np
+MASK = 0xFFFFFFFFFFFFFFFF
+GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+DEFAULT_NOISE_BACKEND = 'sha256'
+def sha256_uniform(seed, x, y, z):
+    """Legacy per-voxel uniform (the original get_mineral_type_no_bias hash)"""
+    hash_digest = hashlib.sha256(f"{seed}:{x}:{y}:{z}".encode()).digest()
+    return int.from_bytes(hash_digest[-8:], 'big') / (2 ** 64)
+def sha256_uniforms(seed, xs, ys, zs):
+    """Legacy uniforms for flat coordinate arrays, identical to sha256_uniform"""
+    tails = b''.join(
+        hashlib.sha256(f"{seed}:{x}:{y}:{z}".encode()).digest()[-8:]
+        for x, y, z in zip(xs.tolist(), ys.tolist(), zs.tolist())
+    )
+    # uint64 -> float64 rounds like int / 2**64, and the power-of-two scale is exact
+    return np.frombuffer(tails, dtype='>u8').astype(np.float64) * 2.0 ** -64
+@lru_cache(maxsize=1024)
+def seed_key(seed):
+    """64-bit key for a seed string (first 8 bytes of its SHA-256, big-endian)"""
+    return int.from_bytes(hashlib.sha256(seed.encode('utf-8')).digest()[:8], 'big')
+def mix64(h):
+    h = ((h ^ (h >> 30)) * MIX1) & MASK
+    h = ((h ^ (h >> 27)) * MIX2) & MASK
+    return h ^ (h >> 31)
+def splitmix64_uniform(seed, x, y, z):
+    """Pure-Python reference for the splitmix64 backend (the spec above, one voxel)"""
+    h = seed_key(seed)
+    for c in (x, y, z):
+        h = mix64(((h + GAMMA) & MASK) ^ (c & MASK))
+    return (h >> 11) / 2 ** 53
+def splitmix64_uniforms(seed, xs, ys, zs):
+    """Vectorized splitmix64 uniforms for int64 coordinate arrays, identical to splitmix64_uniform"""
+    h = np.full(np.shape(xs), seed_key(seed), dtype=np.uint64)
+    for c in (xs, ys, zs):
+        # int64 -> uint64 is the two's complement reinterpretation; uint64 arrays wrap on overflow
+        h = h + np.uint64(GAMMA)
+        h ^= np.asarray(c, dtype=np.int64).astype(np.uint64)
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(MIX1)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(MIX2)
+        h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+NOISE_BACKENDS = {
+    'sha256': (sha256_uniform, sha256_uniforms),
+    'splitmix64': (splitmix64_uniform, splitmix64_uniforms)
+}
+def resolve_noise_backend(seed, requested=None):
+    """Backend name for a request: explicit choice, then a "<backend>:" seed prefix, then the default"""
+    if requested:
+        if requested not in NOISE_BACKENDS:
+            raise ValueError(f"Unknown noise backend: {requested}")
+        return requested
+    prefix = seed.split(':', 1)[0] if ':' in seed else None
+    if prefix in NOISE_BACKENDS:
+        return prefix
+    return DEFAULT_NOISE_BACKEND
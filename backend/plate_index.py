@@ -0,0 +1,167 @@
+"""
+Spatial index for tectonic plate lookups, built once from the plates GeoJSON.
+Each outer ring keeps its edges as NumPy arrays and a bounding box; a coarse lon/lat grid maps every cell to the
+rings whose box overlaps it, so a lookup only runs the (vectorized) crossing test on a handful of candidates.
+The crossing test is the same ray casting as app.point_in_polygon, so lookups return the same plate.
+An optional global raster of plate ids (cell centres) gives O(1) lookups, exact away from plate boundaries.
+"""
+import numpy as np
+GRID_DEG = 10.0 # Bucket size of the candidate grid
+class PlateIndex:
+    def __init__(self, geojson, grid_deg=GRID_DEG):
+        self.names = [] # Plate name per feature, in document order
+        self.rings = [] # (feature index, x1, y1, x2, y2, bbox) per outer ring
+        self.grid_deg = grid_deg
+        for feature_index, feature in enumerate(geojson.get('features', [])):
+            geom = feature['geometry']
+            self.names.append(feature['properties'].get('PlateName', '').lower())
+            if geom['type'] == 'Polygon':
+                polys = [geom['coordinates'][0]]
+            elif geom['type'] == 'MultiPolygon':
+                polys = [poly[0] for poly in geom['coordinates']]
+            else:
+                polys = []
+            for poly in polys:
+                self.rings.extend(self._ring_entries(feature_index, np.asarray(poly, dtype=np.float64)[:, :2]))
+        self.rings.sort(key=lambda ring: ring[0]) # Candidates are tested in document order, like the linear scan
+        # Grid buckets: cell -> ring positions whose bounding box overlaps the cell
+        self.cols = int(np.ceil(360.0 / grid_deg)) + 1
+        self.rows = int(np.ceil(180.0 / grid_deg)) + 1
+        self.buckets = {}
+        for position, ring in enumerate(self.rings):
+            min_x, min_y, max_x, max_y = ring[5]
+            for col in range(self._col(min_x), self._col(max_x) + 1):
+                for row in range(self._row(min_y), self._row(max_y) + 1):
+                    self.buckets.setdefault((col, row), []).append(position)
+        self.raster = None
+        self.raster_res = None
+    def to_arrays(self):
+        """The index as flat NumPy arrays (no Python objects), for PlateIndex.from_arrays and snapshot files"""
+        edges = [np.column_stack(ring[1:5]) for ring in self.rings]
+        cells = sorted(self.buckets)
+        arrays = {
+            'names': np.array(self.names, dtype=str),
+            'grid_deg': np.float64(self.grid_deg),
+            'ring_feature': np.array([ring[0] for ring in self.rings], dtype=np.int32),
+            'ring_offsets': np.concatenate(([0], np.cumsum([len(e) for e in edges]))).astype(np.int64),
+            'ring_bbox': np.array([ring[5] for ring in self.rings], dtype=np.float64).reshape(-1, 4),
+            'edges': np.concatenate(edges) if edges else np.zeros((0, 4), dtype=np.float64),
+            'bucket_cells': np.array(cells, dtype=np.int32).reshape(-1, 2),
+            'bucket_offsets': np.concatenate(([0], np.cumsum([len(self.buckets[c]) for c in cells]))).astype(np.int64),
+            'bucket_rings': np.array([p for c in cells for p in self.buckets[c]], dtype=np.int32)
+        }
+        if self.raster is not None:
+            arrays['raster'] = self.raster
+            arrays['raster_res'] = np.float64(self.raster_res)
+        return arrays
+    @classmethod
+    def from_arrays(cls, arrays, raster_res=None):
+        """Rebuild an index from to_arrays() output; a stored raster is kept only if it has resolution raster_res"""
+        self = cls.__new__(cls)
+        self.names = [str(name) for name in arrays['names']]
+        self.grid_deg = float(arrays['grid_deg'])
+        self.cols = int(np.ceil(360.0 / self.grid_deg)) + 1
+        self.rows = int(np.ceil(180.0 / self.grid_deg)) + 1
+        edges, offsets = arrays['edges'], arrays['ring_offsets']
+        self.rings = [
+            (int(feature_index), *edges[offsets[i]:offsets[i + 1]].T, tuple(float(v) for v in arrays['ring_bbox'][i]))
+            for i, feature_index in enumerate(arrays['ring_feature'])
+        ]
+        bucket_offsets, bucket_rings = arrays['bucket_offsets'], arrays['bucket_rings']
+        self.buckets = {
+            (int(col), int(row)): bucket_rings[bucket_offsets[i]:bucket_offsets[i + 1]].tolist()
+            for i, (col, row) in enumerate(arrays['bucket_cells'])
+        }
+        self.raster = None
+        self.raster_res = None
+        if 'raster' in arrays and raster_res and float(arrays['raster_res']) == raster_res:
+            self.raster = np.asarray(arrays['raster'])
+            self.raster_res = raster_res
+        return self
+    @staticmethod
+    def _ring_entries(feature_index, ring):
+        # Edges (poly[i-1], poly[i]) plus the closing edge, exactly the pairs point_in_polygon visits
+        p1 = np.vstack([ring[-1:], ring[:-1]])
+        p2 = ring
+        jumps = np.abs(p2[:, 0] - p1[:, 0]) > 180
+        off_pole = np.abs(p1[:, 1]) < 90
+        if (jumps & off_pole).any():
+            # Ring crosses the antimeridian (not just running along it to a pole): unwrap it into one continuous
+            # strip and add copies shifted by +-360 degrees, so both sides of the dateline match
+            unwrapped = ring.copy()
+            unwrapped[:, 0] = np.degrees(np.unwrap(np.radians(ring[:, 0])))
+            return [
+                entry for shift in (-360.0, 0.0, 360.0)
+                for entry in PlateIndex._ring_entries(feature_index, unwrapped + [shift, 0.0])
+            ]
+        bbox = (p2[:, 0].min(), p2[:, 1].min(), p2[:, 0].max(), p2[:, 1].max())
+        return [(feature_index, p1[:, 0], p1[:, 1], p2[:, 0], p2[:, 1], bbox)]
+    def _col(self, x):
+        return int(np.clip((x + 180.0) // self.grid_deg, 0, self.cols - 1))
+    def _row(self, y):
+        return int(np.clip((y + 90.0) // self.grid_deg, 0, self.rows - 1))
+    @staticmethod
+    def _crossings(x, y, x1, y1, x2, y2):
+        """Ray-casting crossings of the horizontal ray from (x, y) with each edge (same float steps as point_in_polygon)"""
+        in_span = (y > np.minimum(y1, y2)) & (y <= np.maximum(y1, y2)) & (x <= np.maximum(x1, x2))
+        vertical = x1 == x2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_inters = (y - y1) * (x2 - x1) / (y2 - y1) + x1
+        return in_span & (vertical | (x <= x_inters))
+    def contains(self, position, x, y):
+        _, x1, y1, x2, y2, (min_x, min_y, max_x, max_y) = self.rings[position]
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+        return bool(np.count_nonzero(self._crossings(x, y, x1, y1, x2, y2)) % 2)
+    def lookup(self, lat, lon):
+        """Plate name at (lat, lon) or None; longitudes are wrapped into [-180, 180]"""
+        if self.raster is not None:
+            return self.lookup_raster(lat, lon)
+        lon = ((lon + 180.0) % 360.0) - 180.0
+        candidates = [lon, 180.0] if lon == -180.0 else [lon] # -180 and 180 are the same meridian
+        best = None
+        for x in candidates:
+            for position in self.buckets.get((self._col(x), self._row(lat)), ()):
+                if self.contains(position, x, lat):
+                    feature_index = self.rings[position][0]
+                    best = feature_index if best is None else min(best, feature_index)
+                    break
+        return self.names[best] if best is not None else None
+    def build_raster(self, res_deg):
+        """Global plate-id raster sampled at cell centres (-1 = no plate); rows are latitude bands from -90"""
+        rows = int(round(180.0 / res_deg))
+        cols = int(round(360.0 / res_deg))
+        xs = -180.0 + (np.arange(cols) + 0.5) * res_deg
+        ys = -90.0 + (np.arange(rows) + 0.5) * res_deg
+        raster = np.full((rows, cols), -1, dtype=np.int16)
+        for feature_index, x1, y1, x2, y2, (min_x, min_y, max_x, max_y) in self.rings:
+            row_sel = np.nonzero((ys >= min_y) & (ys <= max_y))[0]
+            col_sel = np.nonzero((xs >= min_x) & (xs <= max_x))[0]
+            if row_sel.size == 0 or col_sel.size == 0:
+                continue
+            for row in row_sel:
+                # Scanline: x of every edge crossing this row, then parity of crossings right of each cell centre
+                y = ys[row]
+                in_span = (y > np.minimum(y1, y2)) & (y <= np.maximum(y1, y2))
+                if not in_span.any():
+                    continue
+                ex1, ey1, ex2, ey2 = x1[in_span], y1[in_span], x2[in_span], y2[in_span]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_inters = np.where(ex1 == ex2, ex1, (y - ey1) * (ex2 - ex1) / (ey2 - ey1) + ex1)
+                x_inters.sort()
+                cell_xs = xs[col_sel]
+                inside = (x_inters.size - np.searchsorted(x_inters, cell_xs, side='left')) % 2 == 1
+                target = raster[row, col_sel]
+                fill = inside & (target == -1) # Earlier features win, as in the linear scan
+                target[fill] = feature_index
+                raster[row, col_sel] = target
+        self.raster = raster
+        self.raster_res = res_deg
+        return raster
+    def lookup_raster(self, lat, lon):
+        lon = ((lon + 180.0) % 360.0) - 180.0
+        rows, cols = self.raster.shape
+        row = min(max(int((lat + 90.0) / self.raster_res), 0), rows - 1)
+        col = min(max(int((lon + 180.0) / self.raster_res), 0), cols - 1)
+        feature_index = self.raster[row, col]
+        return self.names[feature_index] if feature_index >= 0 else None
@@ -0,0 +1,54 @@
+"""
+Startup snapshot: the tectonic plate index compiled into one uncompressed .npz, written by scripts/build_snapshot.py.
+Loading it is a handful of array reads instead of parsing the plates GeoJSON and building the lookup grid (and optional
+raster). The snapshot records the sha256 of the plates file it was built from, so an edited or re-downloaded
+tectonic_plates.json is never paired with a stale index. minerals.json is not part of it: its tables take a few
+milliseconds to build from source and are rebuilt on every hot reload anyway.
+"""
+import hashlib
+import os
+import numpy as np
+from plate_index import PlateIndex
+SNAPSHOT_FORMAT = 3
+PLATES_PREFIX = 'plates_'
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+def build_snapshot(path, plates_path, plate_index):
+    """Write the snapshot of a PlateIndex built from plates_path to path, atomically"""
+    arrays = {
+        'format': np.int32(SNAPSHOT_FORMAT),
+        'plates_sha256': np.array(file_digest(plates_path))
+    }
+    arrays.update({PLATES_PREFIX + key: value for key, value in plate_index.to_arrays().items()})
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(path, allow_pickle=False) # Arrays are read on access, so an unused raster is never loaded
+        if int(self.data['format']) != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path}: snapshot format {int(self.data['format'])}, expected {SNAPSHOT_FORMAT}")
+    def plate_index(self, plates_path, raster_res=None):
+        """PlateIndex from the snapshot, or None if plates_path is missing or no longer the file it was built from"""
+        try:
+            if file_digest(plates_path) != str(self.data['plates_sha256']):
+                print(f"Ignoring the plate index in {self.path}: {plates_path} changed since it was built")
+                return None
+        except OSError:
+            return None
+        keys = [key for key in self.data.files if key.startswith(PLATES_PREFIX)]
+        if not raster_res:
+            keys = [key for key in keys if key != PLATES_PREFIX + 'raster']
+        return PlateIndex.from_arrays({key[len(PLATES_PREFIX):]: self.data[key] for key in keys}, raster_res)
+def load_snapshot(path):
+    """Snapshot at path, or None if there is none (or it can't be read); startup falls back to the source files"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring snapshot {path}: {e}")
+        return None
@@ -0,0 +1,80 @@
+"""
+Visible surface of a chunk, extracted with whole-array neighbour comparisons instead of a per-voxel loop.
+A voxel is solid when its id is not 0 (void). A face is exposed when the neighbour across it is void or outside the
+chunk, which is the culling the 3-D view does. Faces are numbered 0..5 as -x, +x, -y, +y, -z, +z, and that is also
+the bit order of the per-voxel face masks.
+Quads are greedy-meshed per face direction and mineral. Exposed faces are first merged into maximal runs along the
+slice's u axis, then runs with the same start, length and id on consecutive v rows are stacked into one rectangle.
+Both steps are sorts and diffs over all slices at once.
+"""
+import numpy as np
+FACES = ('-x', '+x', '-y', '+y', '-z', '+z')
+# Per axis: the (u, v) axes spanning its faces, and the transpose giving [slice][v][u] with u fastest
+FACE_AXES = {0: (1, 2), 1: (0, 2), 2: (0, 1)}
+SLICE_ORDER = {0: (0, 2, 1), 1: (1, 2, 0), 2: (2, 1, 0)}
+def exposed_faces(ids):
+    """(6, nx, ny, nz) bool: face f of the voxel is solid and borders void or the chunk edge"""
+    solid = ids != 0
+    empty = np.pad(~solid, 1, constant_values=True)
+    nx, ny, nz = ids.shape
+    inner = (slice(1, nx + 1), slice(1, ny + 1), slice(1, nz + 1))
+    faces = np.empty((6,) + ids.shape, dtype=bool)
+    for face in range(6):
+        axis, step = divmod(face, 2)
+        neighbour = list(inner)
+        start = inner[axis].start + (1 if step else -1)
+        neighbour[axis] = slice(start, start + ids.shape[axis])
+        faces[face] = solid & empty[tuple(neighbour)]
+    return faces
+def exposed_voxels(ids):
+    """Voxels with at least one exposed face: coords (n, 3) int, their ids, and a 6-bit face mask each (flat-index order)"""
+    faces = exposed_faces(ids)
+    bits = (faces.astype(np.uint8) << np.arange(6, dtype=np.uint8)[:, None, None, None]).sum(axis=0, dtype=np.uint8)
+    coords = np.argwhere(bits)
+    x, y, z = coords.T
+    return coords, ids[x, y, z], bits[x, y, z]
+def greedy_quads(ids):
+    """
+    Quads covering every exposed face as a dict of equal-length arrays: face (0-5), x, y, z (the voxel at the quad's
+    lowest corner), du, dv (extent along the face's u and v axes, see FACE_AXES) and id.
+    """
+    faces = exposed_faces(ids)
+    columns = {key: [] for key in ('face', 'x', 'y', 'z', 'du', 'dv', 'id')}
+    for face in range(6):
+        axis = face // 2
+        labels = np.ascontiguousarray(np.where(faces[face], ids, 0).transpose(SLICE_ORDER[axis]))
+        n_slices, n_v, n_u = labels.shape
+        flat = labels.ravel()
+        if not flat.any():
+            continue
+        # Runs along u: a run starts at each row start and wherever the id changes
+        starts = np.ones(flat.size, dtype=bool)
+        starts[1:] = flat[1:] != flat[:-1]
+        starts[::n_u] = True
+        positions = np.flatnonzero(starts)
+        lengths = np.diff(np.append(positions, flat.size))
+        keep = flat[positions] != 0
+        positions, lengths = positions[keep], lengths[keep]
+        labels_run = flat[positions]
+        s, v, u = positions // (n_v * n_u), positions // n_u % n_v, positions % n_u
+        # Stack identical runs on consecutive rows of the same slice
+        order = np.lexsort((v, labels_run, lengths, u, s))
+        s, v, u, lengths, labels_run = s[order], v[order], u[order], lengths[order], labels_run[order]
+        new_quad = np.ones(s.size, dtype=bool)
+        new_quad[1:] = (
+            (s[1:] != s[:-1]) | (u[1:] != u[:-1]) | (lengths[1:] != lengths[:-1])
+            | (labels_run[1:] != labels_run[:-1]) | (v[1:] != v[:-1] + 1)
+        )
+        first = np.flatnonzero(new_quad)
+        heights = np.diff(np.append(first, s.size))
+        corner = np.empty((first.size, 3), dtype=np.int64)
+        u_axis, v_axis = FACE_AXES[axis]
+        corner[:, axis], corner[:, u_axis], corner[:, v_axis] = s[first], u[first], v[first]
+        columns['face'].append(np.full(first.size, face))
+        columns['x'].append(corner[:, 0])
+        columns['y'].append(corner[:, 1])
+        columns['z'].append(corner[:, 2])
+        columns['du'].append(lengths[first])
+        columns['dv'].append(heights)
+        columns['id'].append(labels_run[first])
+    return {key: np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64) for key, parts in columns.items()}
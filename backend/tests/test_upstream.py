@@ -0,0 +1,125 @@
+"""UpstreamClient against a local stub server: pacing, retries with backoff, and the circuit breaker's life cycle."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import upstream
+from upstream import CircuitOpenError, RateLimitedError, UpstreamClient
+class StubServer:
+    """Serves scripted responses: each request pops the next (status, headers) or repeats the last one"""
+    def __init__(self):
+        self.script = [(200, {})]
+        self.hits = 0
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                status, headers = stub.script.pop(0) if len(stub.script) > 1 else stub.script[0]
+                body = b'{}'
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                pass
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.host = f'127.0.0.1:{self.server.server_address[1]}'
+        self.url = f'http://{self.host}/'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(upstream, 'BACKOFF_BASE', 0.05)
+    monkeypatch.setitem(upstream.HOST_POLICIES, server.host, {'rate': 100.0, 'burst': 100})
+    yield server
+    server.close()
+def breaker(client, stub):
+    return client._host(stub.host)['breaker']
+def test_token_bucket_paces_requests(stub, monkeypatch):
+    monkeypatch.setitem(upstream.HOST_POLICIES, stub.host, {'rate': 10.0, 'burst': 1})
+    client = UpstreamClient()
+    start = time.monotonic()
+    for _ in range(5):
+        assert client.get(stub.url).status_code == 200
+    assert time.monotonic() - start >= 0.35 # One immediate request, then four at 10/s
+    assert stub.hits == 5
+def test_rate_limit_beyond_timeout_is_not_a_host_failure(stub, monkeypatch):
+    monkeypatch.setitem(upstream.HOST_POLICIES, stub.host, {'rate': 1.0, 'burst': 1})
+    client = UpstreamClient()
+    client.get(stub.url)
+    with pytest.raises(RateLimitedError):
+        client.get(stub.url, timeout=0.2)
+    assert stub.hits == 1
+    assert breaker(client, stub).failures == 0
+    assert breaker(client, stub).state == 'closed'
+@pytest.mark.parametrize('status', [503, 429])
+def test_retries_with_backoff_then_succeeds(stub, status):
+    stub.script = [(status, {}), (status, {}), (200, {})]
+    client = UpstreamClient()
+    start = time.monotonic()
+    assert client.get(stub.url).status_code == 200
+    assert stub.hits == 3
+    assert time.monotonic() - start >= 0.05 * 0.5 + 0.1 * 0.5 # Two jittered backoffs
+    assert breaker(client, stub).failures == 0
+def test_retries_are_bounded(stub):
+    stub.script = [(503, {})]
+    client = UpstreamClient()
+    with pytest.raises(requests.HTTPError):
+        client.get(stub.url)
+    assert stub.hits == upstream.MAX_RETRIES + 1
+    assert breaker(client, stub).failures == 1
+def test_breaker_opens_half_opens_and_closes(stub, monkeypatch):
+    monkeypatch.setattr(upstream, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(upstream, 'BREAKER_THRESHOLD', 2)
+    monkeypatch.setattr(upstream, 'BREAKER_COOLDOWN', 0.2)
+    stub.script = [(503, {})]
+    client = UpstreamClient()
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.get(stub.url)
+    assert breaker(client, stub).state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+    assert stub.hits == 2 # Failing fast never reaches the host
+    time.sleep(0.25)
+    assert breaker(client, stub).state == 'half_open'
+    stub.script = [(200, {})]
+    assert client.get(stub.url).status_code == 200
+    assert breaker(client, stub).state == 'closed'
+def test_failed_half_open_trial_reopens(stub, monkeypatch):
+    monkeypatch.setattr(upstream, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(upstream, 'BREAKER_THRESHOLD', 1)
+    monkeypatch.setattr(upstream, 'BREAKER_COOLDOWN', 0.2)
+    stub.script = [(503, {})]
+    client = UpstreamClient()
+    with pytest.raises(requests.HTTPError):
+        client.get(stub.url)
+    time.sleep(0.25)
+    with pytest.raises(requests.HTTPError): # The trial fails: open again for another cooldown
+        client.get(stub.url)
+    assert breaker(client, stub).state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+def test_other_request_errors_settle_the_half_open_trial(stub, monkeypatch):
+    monkeypatch.setattr(upstream, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(upstream, 'BREAKER_THRESHOLD', 1)
+    monkeypatch.setattr(upstream, 'BREAKER_COOLDOWN', 0.2)
+    stub.script = [(503, {})]
+    client = UpstreamClient()
+    with pytest.raises(requests.HTTPError):
+        client.get(stub.url)
+    time.sleep(0.25)
+    stub.script = [(302, {'Location': '/'})] # Redirect loop during the trial: TooManyRedirects, not a ConnectionError
+    with pytest.raises(requests.TooManyRedirects):
+        client.get(stub.url)
+    assert breaker(client, stub).state == 'open'
+    time.sleep(0.25)
+    stub.script = [(200, {})]
+    assert client.get(stub.url).status_code == 200 # The trial was settled, so the host isn't blacklisted
+    assert breaker(client, stub).state == 'closed'
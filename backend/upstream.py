@@ -0,0 +1,149 @@
+"""
+HTTP client for the upstream geology APIs.
+One pooled keep-alive requests.Session per host, a per-host token bucket (Nominatim allows 1 request/s),
+bounded retries with jittered exponential backoff, and a per-host circuit breaker that fails fast while an
+upstream is down so callers drop straight into their procedural fallback.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+# Per-host policy: rate (requests/s), burst (bucket size); hosts not listed use DEFAULT_POLICY
+HOST_POLICIES = {
+    'nominatim.openstreetmap.org': {'rate': 1.0, 'burst': 1},
+    'api.open-elevation.com': {'rate': 5.0, 'burst': 5},
+    'mrdata.usgs.gov': {'rate': 5.0, 'burst': 5},
+    'api.mindat.org': {'rate': 5.0, 'burst': 5}
+}
+DEFAULT_POLICY = {'rate': 10.0, 'burst': 10}
+MAX_RETRIES = 2 # Extra attempts after the first, for connection errors, timeouts, 429 and 5xx
+BACKOFF_BASE = 0.5 # Seconds; attempt n waits BACKOFF_BASE * 2**n, jittered by +-50%
+BREAKER_THRESHOLD = 5 # Consecutive failures that open a host's circuit
+BREAKER_COOLDOWN = 30.0 # Seconds an open circuit fails fast before one trial request is let through
+POOL_SIZE = 16 # Keep-alive connections per host
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+class CircuitOpenError(requests.RequestException):
+    """Raised without touching the network while a host's circuit is open"""
+class RateLimitedError(requests.RequestException):
+    """Raised when waiting for a rate-limit token would blow the caller's timeout"""
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    def reserve(self):
+        """Take a token, returning how long the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+    def refund(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown and not self.trial_running:
+                self.trial_running = True # Half-open: one request decides whether the circuit closes
+                return True
+            return False
+    def release(self):
+        """End a half-open trial that never reached the host, without counting it either way"""
+        with self.lock:
+            self.trial_running = False
+    def record(self, ok):
+        with self.lock:
+            self.trial_running = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.threshold or self.opened_at is not None:
+                    self.opened_at = time.monotonic()
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+class UpstreamClient:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.hosts = {}
+        self.lock = threading.Lock()
+    def _host(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None:
+                policy = HOST_POLICIES.get(host, DEFAULT_POLICY)
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                state = {'session': session, 'bucket': TokenBucket(policy['rate'], policy['burst']), 'breaker': CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)}
+                self.hosts[host] = state
+            return state
+    def get(self, url, headers=None, timeout=10):
+        """GET with pooling, rate limiting, retries and circuit breaking; returns the final requests.Response"""
+        host = urlsplit(url).netloc
+        state = self._host(host)
+        breaker = state['breaker']
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+        deadline = time.monotonic() + timeout
+        outcome = None # True/False once the host's health is known; otherwise the breaker is only released
+        try:
+            last_error = None
+            for attempt in range(MAX_RETRIES + 1):
+                wait = state['bucket'].reserve()
+                if time.monotonic() + wait >= deadline:
+                    state['bucket'].refund()
+                    if last_error is None: # Our own request rate, not the host's health
+                        raise RateLimitedError(f"Rate limit for {host} exceeds the timeout")
+                    break
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    resp = state['session'].get(url, headers=headers, timeout=max(0.1, deadline - time.monotonic()))
+                    if resp.status_code not in RETRY_STATUSES:
+                        outcome = True
+                        return resp
+                    last_error = requests.HTTPError(f"{host} returned {resp.status_code}", response=resp)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    last_error = e
+                except requests.RequestException:
+                    outcome = False # Broken responses (bad encoding, redirect loops) count against the host but aren't retried
+                    raise
+                backoff = BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if attempt == MAX_RETRIES or time.monotonic() + backoff >= deadline:
+                    break
+                time.sleep(backoff)
+            outcome = False
+            raise last_error
+        finally:
+            if outcome is None:
+                breaker.release()
+            else:
+                breaker.record(outcome)
+    def stats(self):
+        with self.lock:
+            return {
+                host: {'circuit': state['breaker'].state, 'consecutive_failures': state['breaker'].failures}
+                for host, state in self.hosts.items()
+            }
@@ -0,0 +1,80 @@
+"""
+Persistent process pool for CPU-bound chunk generation.
+Workers write their results straight into shared memory allocated by the caller, so large id/uniform
+arrays are never pickled. LITHOS_GEN_WORKERS sets the worker count (default: one per core).
+Workers come from a forkserver (spawn where there is none), never a plain fork: the pool starts lazily from a request
+thread while other threads may hold locks, and a forked child would inherit them held.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+GEN_WORKERS = int(os.environ.get('LITHOS_GEN_WORKERS', 0)) or os.cpu_count() or 1
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+if START_METHOD == 'forkserver':
+    # Preloading __main__ would run the app's import-time setup (warmup thread, SQLite connections) in the fork server
+    # itself; with nothing preloaded it stays single-threaded and each worker imports what it needs after the fork
+    multiprocessing.get_context(START_METHOD).set_forkserver_preload([])
+_pool = None
+_pool_lock = threading.Lock()
+def get_pool(initializer=None, initargs=()):
+    """The shared ProcessPoolExecutor, started on first use (initializer(*initargs) runs once in each worker)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=GEN_WORKERS, mp_context=multiprocessing.get_context(START_METHOD), initializer=initializer, initargs=initargs
+            )
+        return _pool
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+def retire_pool():
+    """Detach the current pool without waiting: queued and running tasks still finish, new work gets fresh workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+atexit.register(shutdown_pool)
+def split_range(n, parts):
+    """Split range(n) into at most `parts` contiguous (start, stop) pieces of near-equal length"""
+    parts = max(1, min(parts, n))
+    bounds = np.linspace(0, n, parts + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+class SharedArrays:
+    """
+    Named shared-memory block holding several arrays back to back, described by a layout of
+    (name, shape, dtype). The creator owns (and unlinks) the block; workers attach by block name.
+    """
+    def __init__(self, layout, name=None):
+        self.layout = [(key, tuple(shape), np.dtype(dtype)) for key, shape, dtype in layout]
+        size = sum(int(np.prod(shape)) * dtype.itemsize for _, shape, dtype in self.layout)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.arrays = {}
+        offset = 0
+        for key, shape, dtype in self.layout:
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += int(np.prod(shape)) * dtype.itemsize
+    @property
+    def name(self):
+        return self.shm.name
+    def close(self):
+        self.arrays = {} # Views must go before the buffer can be released
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
@@ -24,7 +24,7 @@ function App() {
   useEffect(() => {
     const fetchMinerals = async () => {
       try {
-        const response = await fetch('/minerals.json');
+        const response = await fetch('/api/catalog/render');
         if (response.ok) {
           const data = await response.json();
           const colors = {
@@ -40,7 +40,7 @@ function App() {
           setMineralColors(colors);
         }
       } catch (error) {
-        console.error('Error fetching minerals.json:', error);
+        console.error('Error fetching mineral catalog:', error);
       }
     };
     fetchMinerals();
@@ -1,9 +1,21 @@
-import React, { useEffect, useState, useMemo, useRef } from 'react';
+import React, { useCallback, useEffect, useState, useMemo, useRef } from 'react';
 import * as THREE from 'three';
 import { Canvas, useThree } from '@react-three/fiber';
 import { OrbitControls, Box, Instances, Instance, Text } from '@react-three/drei'; // Removed axesHelper if not used
 import { TrackballControls } from '@react-three/drei';
-function Voxels({ chunk, size, mined, mineralColors, mineralData }) {
+const COVER_DEPTH = 1; // Top z-planes that start under the cover layer
+// Flat voxel indices from the [start, length, ...] runs /api/mined and /api/cover return
+function decodeRuns(runs) {
+  const indices = [];
+  for (let i = 0; i < runs.length; i += 2) {
+    for (let index = runs[i]; index < runs[i] + runs[i + 1]; index++) indices.push(index);
+  }
+  return indices;
+}
+function isCovered(cover, size, x, y, z) {
+  return z < cover.depth && !cover.uncovered.has((x * size + y) * size + z);
+}
+function Voxels({ chunk, size, cover, mineralColors, mineralData }) {
   if (!chunk || chunk.length === 0 || !mineralData) return null;
   const textures = useMemo(() => {
     if (!mineralData) return {};
@@ -97,10 +109,9 @@ function Voxels({ chunk, size, mined, mineralColors, mineralData }) {
     chunk.forEach((plane, x) => {
       plane.forEach((row, y) => {
         row.forEach((mineral, z) => {
-          const minedValue = mined[x][y][z];
           let displayType = null;
-          if (minedValue && minedValue.startsWith('cover_')) {
-            displayType = minedValue;
+          if (isCovered(cover, size, x, y, z)) {
+            displayType = cover.id;
           } else {
             displayType = mineral === 'void' ? null : mineral;
           }
@@ -112,7 +123,7 @@ function Voxels({ chunk, size, mined, mineralColors, mineralData }) {
       });
     });
     return groups;
-  }, [chunk, size, mined, mineralColors]);
+  }, [chunk, size, cover, mineralColors]);
   return (
     <group>
       {Object.entries(minerals).map(([type, positions]) => (
@@ -208,48 +219,74 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const response = await fetch('/minerals.json');
+        const response = await fetch('/api/catalog/render');
         if (response.ok) {
           setMineralData(await response.json());
         }
       } catch (error) {
-        console.error('Error fetching minerals.json:', error);
+        console.error('Error fetching mineral catalog:', error);
       }
     };
     fetchData();
   }, []);
   const coverVariants = useMemo(() => mineralData?.coverVariants?.map(v => v.id) ?? [], [mineralData]);
-  const depthLayers = useMemo(() => {
-    if (!mineralData) return [];
-    const layersMap = {
-      "0-10": [0, 10],
-      "11-35": [11, 35],
-      "36-inf": [36, Infinity]
-    };
-    return Object.entries(layersMap).map(([key, range]) => {
-      const probs = {};
-      Object.entries(mineralData.minerals).forEach(([name, data]) => {
-        const prob = data.prob_layers?.[key] ?? 0.0;
-        if (prob > 0) probs[name] = prob;
-      });
-      probs['void'] = (range[0] === 0 || range[0] === 11) ? 0.1 : 0.05;
-      return { range, probs };
-    });
-  }, [mineralData]);
   const [chunk, setChunk] = useState([]);
-  const [mined, setMined] = useState(() => {
-    const stored = localStorage.getItem('mined');
-    if (stored) return JSON.parse(stored);
-    return Array.from({ length: size }, () => Array.from({ length: size }, () => Array(size).fill(null)));
-  });
-  const [maxMinedDepth, setMaxMinedDepth] = useState(0);
+  // Cover layer and mined voxels live on the server (/api/cover, /api/mined); we keep the uncovered flat indices and the log version
+  const [cover, setCover] = useState({ id: null, depth: 0, version: 0, uncovered: new Set(), maxMinedDepth: 0 });
   const [usedMinerals, setUsedMinerals] = useState([]);
   const groupRef = useRef();
   const cameraRef = useRef(null);
   const controlsRef = useRef(null);
+  const chunkParams = useMemo(() => ({
+    seed,
+    size,
+    x_offset: xOffset,
+    y_offset: yOffset,
+    z_offset: zOffset,
+    chunk_x: chunkX,
+    chunk_y: chunkY,
+    chunk_z: chunkZ
+  }), [seed, size, xOffset, yOffset, zOffset, chunkX, chunkY, chunkZ]);
+  const fetchCover = useCallback(async (since = 0) => {
+    const params = new URLSearchParams({ ...chunkParams, depth: COVER_DEPTH, since });
+    if (coverVariant) {
+      params.append('cover_variant', coverVariant);
+    }
+    try {
+      const response = await fetch(`/api/cover?${params.toString()}`);
+      if (!response.ok) {
+        console.error('Error fetching cover');
+        return;
+      }
+      const data = await response.json();
+      setCover((prev) => {
+        // full=false: only voxels mined after `since` came back
+        const uncovered = data.full ? new Set() : new Set(prev.uncovered);
+        decodeRuns(data.uncovered).forEach((index) => uncovered.add(index));
+        return { id: data.cover, depth: data.depth, version: data.version, uncovered, maxMinedDepth: data.max_mined_depth };
+      });
+    } catch (error) {
+      console.error('Cover fetch error:', error);
+    }
+  }, [chunkParams, coverVariant]);
   useEffect(() => {
-    localStorage.removeItem('mined');
-  }, [seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX, chunkY, chunkZ, testMode, selectedMinerals]);
+    fetchCover(0);
+  }, [fetchCover]);
+  const mineVoxel = useCallback(async (x, y, z) => {
+    try {
+      const response = await fetch('/api/mined', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...chunkParams, voxels: [[x, y, z]] })
+      });
+      if (!response.ok) {
+        console.error('Error saving mined voxel');
+      }
+    } catch (error) {
+      console.error('Mine error:', error);
+    }
+    fetchCover(cover.version); // Picks up max_mined_depth and edits made elsewhere
+  }, [chunkParams, cover.version, fetchCover]);
   useEffect(() => {
     if (!mineralData) return;  // Added: Guard against race condition
     const fetchChunk = async () => {
@@ -276,14 +313,6 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
           setChunk(chunkData);
           setChunkDebugData(data.debug_info || null); // Set debug data
           console.log("Model generated successfully. Chunk data:", data);
-          const stored = localStorage.getItem('mined');
-          if (stored) {
-            setMined(JSON.parse(stored));
-          } else {
-            const newMined = await initializeMined(chunkData, size, seed, xOffset, yOffset, zOffset, probOffsets, crustType, testMode ? selectedMinerals : null, depthLayers);
-            setMined(newMined);
-            localStorage.setItem('mined', JSON.stringify(newMined));
-          }
           // Initial unique minerals from chunk (moved to separate useEffect for full scan)
         } else {
           console.error('Error fetching chunk');
@@ -293,55 +322,22 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
       }
     };
     fetchChunk();
-  }, [seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX, chunkY, chunkZ, testMode, selectedMinerals, depthLayers, crustType, mineralData, setChunkDebugData]);
-  // New useEffect for computing usedMinerals including covers from mined
+  }, [seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX, chunkY, chunkZ, testMode, selectedMinerals, mineralData, setChunkDebugData]);
+  // New useEffect for computing usedMinerals including the cover while any of it is left
   useEffect(() => {
-    if (chunk.length > 0 && mined.length > 0) {
+    if (chunk.length > 0) {
       const allUnique = new Set();
-      chunk.forEach((plane, x) => {
-        plane.forEach((row, y) => {
-          row.forEach((mineral, z) => {
+      chunk.forEach((plane) => {
+        plane.forEach((row) => {
+          row.forEach((mineral) => {
             if (mineral !== 'void') allUnique.add(mineral);
-            const minedVal = mined[x][y][z];
-            if (minedVal && minedVal.startsWith('cover_')) allUnique.add(minedVal);
           });
         });
       });
+      if (cover.id && cover.uncovered.size < size * size * cover.depth) allUnique.add(cover.id);
       setUsedMinerals(Array.from(allUnique).sort());
     }
-  }, [chunk, mined]);
-  const initializeMined = async (chunk, size, seed, xOffset, yOffset, zOffset, probOffsets, crustType, allowedMinerals, depthLayers) => {
-    const newMined = Array.from({ length: size }, () => Array.from({ length: size }, () => Array(size).fill(null)));
-    let coverId;
-    if (coverVariant) {
-      coverId = coverVariant;
-    } else {
-      if (!mineralData || !mineralData.coverVariants) {  // Added: Extra safeguard (though race fix should prevent)
-        console.error('mineralData not ready for covers; using default');
-        coverId = 'clayey_mudflat';  // Fallback to your default from minerals.json
-      } else {
-        const variants = mineralData.coverVariants.map(v => v.id);
-        const randomIndex = Math.floor(Math.random() * variants.length);
-        coverId = variants[randomIndex];
-      }
-    }
-    for (let lx = 0; lx < size; lx++) {
-      for (let ly = 0; ly < size; ly++) {
-        newMined[lx][ly][0] = `cover_${coverId}`;
-      }
-    }
-    return newMined;
-  };
-  useEffect(() => {
-    let newMax = 0;
-    while (true) {
-      const layerFullyMined = !mined.some(plane => plane.some(row => row[newMax] && row[newMax].startsWith('cover_')));
-      if (!layerFullyMined) break;
-      newMax++;
-      if (newMax >= size) break;
-    }
-    setMaxMinedDepth(newMax);
-  }, [mined, size]);
+  }, [chunk, cover, size]);
   useEffect(() => {
     const handleClick = (event) => {
       const mouse = new THREE.Vector2();
@@ -357,12 +353,11 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
         const x = Math.floor(point.x + size / 2);
         const y = Math.floor(point.y + size / 2);
         const z = Math.floor(point.z + size / 2);
-        if (z < size && x >= 0 && x < size && y >= 0 && y < size && z >= 0 && z <= maxMinedDepth) {
-          if (mined[x][y][z] && mined[x][y][z].startsWith('cover_')) {
-            const newMined = mined.map(plane => plane.map(row => row.slice()));
-            newMined[x][y][z] = chunk[x][y][z];
-            setMined(newMined);
-            localStorage.setItem('mined', JSON.stringify(newMined));
+        if (z < size && x >= 0 && x < size && y >= 0 && y < size && z >= 0 && z <= cover.maxMinedDepth) {
+          if (isCovered(cover, size, x, y, z)) {
+            const index = (x * size + y) * size + z;
+            setCover((prev) => ({ ...prev, uncovered: new Set(prev.uncovered).add(index) })); // Shown at once; the server confirms
+            mineVoxel(x, y, z);
             alert(`Mined ${chunk[x][y][z]}: Example info (e.g., SiO2 for quartz).`);
           }
         }
@@ -370,7 +365,7 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
     };
     window.addEventListener('pointerdown', handleClick);
     return () => window.removeEventListener('pointerdown', handleClick);
-  }, [chunk, mined, size, maxMinedDepth]);
+  }, [chunk, cover, size, mineVoxel]);
   const snapToAxis = (axis, positive) => {
     const dist = size * 1.5;
     let pos = [0, 0, 0];
@@ -397,7 +392,7 @@ function Explorer3D({ seed, xOffset, yOffset, zOffset, size, probOffsets, chunkX
         <ambientLight intensity={2.0} />
         <pointLight position={[0, 0, size * 2]} intensity={5.0} />
         <group ref={groupRef}>
-          <Voxels chunk={chunk} size={size} mined={mined} mineralColors={mineralColors} mineralData={mineralData} />
+          <Voxels chunk={chunk} size={size} cover={cover} mineralColors={mineralColors} mineralData={mineralData} />
         </group>
         <Box position={[0, 0, 0]} args={[2, 2, 2]}>
           <meshStandardMaterial color="red" emissive="red" emissiveIntensity={0.5} />
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PLATES_URL = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_plates.json"
+
+
+def download_plates(path):
+    """Fetch the PB2002 plates GeoJSON to path (the server itself never downloads it)"""
+    with urllib.request.urlopen(PLATES_URL, timeout=60) as resp:
+        data = resp.read()
+    json.loads(data) # Refuse to write anything that isn't JSON
+    with open(path, 'wb') as f:
+        f.write(data)
+    print(f"Downloaded {len(data)} bytes to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the tectonic plate index into the startup snapshot the backend loads.")
+    parser.add_argument('--out', type=str, default=os.path.join(BACKEND_DIR, 'snapshot.npz'),
+                        help="Snapshot to write (default: backend/snapshot.npz, where the server looks; see LITHOS_SNAPSHOT_PATH)")
+    parser.add_argument('--plates', type=str, default=os.path.join(BACKEND_DIR, 'tectonic_plates.json'),
+                        help="Plates GeoJSON to index (default: backend/tectonic_plates.json)")
+    parser.add_argument('--download-plates', action='store_true',
+                        help="Download the plates GeoJSON to --plates first")
+    parser.add_argument('--raster-res', type=float, default=float(os.environ.get('LITHOS_PLATE_RASTER_RES', 0)),
+                        help="Also store the plate raster at this resolution in degrees; it is used when the server runs with the "
+                             "same LITHOS_PLATE_RASTER_RES (default: that variable, else 0 = no raster)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    from plate_index import PlateIndex
+    from snapshot import build_snapshot, load_snapshot
+
+    if args.download_plates:
+        download_plates(args.plates)
+
+    if not os.path.exists(args.plates):
+        sys.exit(f"{args.plates} not found; nothing to snapshot (use --download-plates)")
+    start = time.time()
+    with open(args.plates, 'r') as f:
+        plate_index = PlateIndex(json.load(f))
+    if args.raster_res > 0:
+        plate_index.build_raster(args.raster_res)
+    print(f"{args.plates}: {len(plate_index.names)} plates, {len(plate_index.rings)} rings"
+          + (f", raster at {args.raster_res} degrees" if args.raster_res > 0 else ""))
+    build_snapshot(args.out, args.plates, plate_index)
+    print(f"Wrote {args.out} ({os.path.getsize(args.out)} bytes) in {time.time() - start:.2f}s")
+
+    # Time what the server will do with it
+    start = time.time()
+    snapshot = load_snapshot(args.out)
+    snapshot.plate_index(args.plates, args.raster_res)
+    print(f"Snapshot loads in {(time.time() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a region of chunks once and store them in the on-disk chunk store /api/chunk3d serves from.")
+    parser.add_argument('--box', type=int, nargs=6, metavar=('CX0', 'CY0', 'CZ0', 'CX1', 'CY1', 'CZ1'), default=[-1, -1, 0, 1, 1, 0],
+                        help="Inclusive chunk coordinates of the region, as chunk_x/y/z in /api/chunk3d (default: -1 -1 0 1 1 0)")
+    parser.add_argument('--location', type=str, default=None,
+                        help="Take offsets and prob_offsets from /api/offsets for this location (e.g. \"Valparaiso\" or \"-33.05,-71.6\")")
+    parser.add_argument('--x-offset', type=int, default=0)
+    parser.add_argument('--y-offset', type=int, default=0)
+    parser.add_argument('--z-offset', type=int, default=0)
+    parser.add_argument('--prob-offsets', type=str, default='{}', help="JSON object, as the prob_offsets query parameter")
+    parser.add_argument('--allowed-minerals', type=str, default='[]', help="JSON list, as the allowed_minerals query parameter")
+    parser.add_argument('--seed', type=str, default='default_seed')
+    parser.add_argument('--size', type=int, default=32, help="Chunk size (default: 32, at most 128 like /api/chunk3d)")
+    parser.add_argument('--noise', type=str, default=None, help="Hash backend (default: the server's default for the seed)")
+    parser.add_argument('--no-vein-bias', action='store_true', help="Store chunks for use_vein_bias=false")
+    parser.add_argument('--parallel', action='store_true', help="Generate each chunk on the worker pool")
+    parser.add_argument('--force', action='store_true', help="Generate again even if the chunk is already stored")
+    parser.add_argument('--store', type=str, default=os.path.join(BACKEND_DIR, 'chunk_store'),
+                        help="Chunk store directory (default: backend/chunk_store, where the server looks; see LITHOS_CHUNK_STORE_PATH)")
+    args = parser.parse_args()
+
+    # The backend opens its data files relative to its own directory
+    os.environ['LITHOS_CHUNK_STORE_PATH'] = os.path.abspath(args.store)
+    os.environ.setdefault('LITHOS_WARMUP', 'false')
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    import app
+
+    size = min(args.size, 128)
+    offsets = [args.x_offset, args.y_offset, args.z_offset]
+    prob_offsets = json.loads(args.prob_offsets)
+    if args.location:
+        result = app.resolve_location(args.location)
+        # Like LocationInput.js, only x/y come from the location; the depth stays --z-offset (0 is the surface the 3-D view opens at)
+        offsets = [result[0] + args.x_offset, result[1] + args.y_offset, args.z_offset]
+        prob_offsets = dict(result[4], **prob_offsets)
+        print(f"{args.location}: offsets {offsets[0]}, {offsets[1]}, {offsets[2]}, {result[3]} crust, prob_offsets {json.dumps(result[4])}")
+    model = app.probability_model(prob_offsets, json.loads(args.allowed_minerals) or None)
+    noise = app.resolve_noise_backend(args.seed, args.noise)
+    use_vein_bias = not args.no_vein_bias
+    generate = app.generate_3d_chunk_ids_parallel if args.parallel else app.generate_3d_chunk_ids
+    x0, y0, z0, x1, y1, z1 = args.box
+    coords = [(cx, cy, cz) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1) for cz in range(z0, z1 + 1)]
+    print(f"{len(coords)} chunks of {size}^3, seed {args.seed!r}, noise {noise}, vein bias {use_vein_bias}, model {model.fingerprint}")
+
+    start = time.time()
+    stored = skipped = 0
+    try:
+        for done, c in enumerate(coords, 1):
+            origin = [o + size * ci for o, ci in zip(offsets, c)]
+            world = (args.seed, noise, size, model.fingerprint, use_vein_bias)
+            if not args.force and app.CHUNK_STORE.contains(*world, *origin):
+                skipped += 1
+                continue
+            app.CHUNK_STORE.put(*world, *origin, generate(args.seed, size, *origin, model, use_vein_bias, noise))
+            stored += 1
+            rate = stored / max(time.time() - start, 1e-9)
+            print(f"[{done}/{len(coords)}] chunk {c[0]},{c[1]},{c[2]} stored ({rate:.2f} chunks/s)", flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume")
+    print(f"Stored {stored}, already present {skipped}, in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
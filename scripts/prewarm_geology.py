@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def read_locations(paths):
+    """Location strings (free text or "lat,lon"), one per line; blank lines and # comments are skipped"""
+    seen = set()
+    locations = []
+    for path in paths:
+        f = sys.stdin if path == '-' else open(path, 'r')
+        with f:
+            for line in f:
+                location = line.strip()
+                if location and not location.startswith('#') and location not in seen:
+                    seen.add(location)
+                    locations.append(location)
+    return locations
+
+
+def warm_chunks(server, offsets, seed, size, radius):
+    """
+    Ask a running backend for the surface chunks around a location, one /api/chunk3d request per chunk with the
+    frontend's parameters (vein bias on, default noise). Like LocationInput.js only x/y come from the location; the view
+    starts at the surface (z_offset=0), so the location's z_offset is not used.
+    """
+    for chunk_x in range(-radius, radius + 1):
+        for chunk_y in range(-radius, radius + 1):
+            params = {
+                'seed': seed,
+                'size': size,
+                'x_offset': offsets['x_offset'],
+                'y_offset': offsets['y_offset'],
+                'z_offset': 0,
+                'prob_offsets': json.dumps(offsets['prob_offsets']),
+                'chunk_x': chunk_x,
+                'chunk_y': chunk_y,
+                'chunk_z': 0,
+                'format': 'bin' # Same cache entry as the frontend's JSON request, without building the JSON
+            }
+            url = server.rstrip('/') + '/api/chunk3d?' + urllib.parse.urlencode(params)
+            with urllib.request.urlopen(url, timeout=300) as resp:
+                resp.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve locations in bulk and store their geology offsets for /api/offsets.")
+    parser.add_argument('inputs', nargs='+',
+                        help="Files with one location (\"Valparaiso\" or \"-33.05,-71.6\") per line; - reads stdin")
+    parser.add_argument('--cache', type=str, default=os.path.join(BACKEND_DIR, 'geo_cache.sqlite3'),
+                        help="Lookup store to fill (default: backend/geo_cache.sqlite3, the one the server uses)")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Locations resolved at once; per-host rate limits still apply (default: 4)")
+    parser.add_argument('--force', action='store_true',
+                        help="Resolve again even if the location is already stored")
+    parser.add_argument('--server', type=str, default=None,
+                        help="Base URL of a running backend (e.g. http://localhost:5000) to pre-generate surface chunks on")
+    parser.add_argument('--seed', type=str, default='default_seed', help="Seed for chunk pre-generation (default: default_seed)")
+    parser.add_argument('--size', type=int, default=32, help="Chunk size for chunk pre-generation (default: 32)")
+    parser.add_argument('--radius', type=int, default=1,
+                        help="Surface chunks within this many chunks of the origin are generated (default: 1, a 3x3 ring)")
+    args = parser.parse_args()
+
+    locations = read_locations(args.inputs)
+
+    # The backend opens its data files relative to its own directory
+    os.environ['LITHOS_GEO_CACHE_PATH'] = os.path.abspath(args.cache)
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    os.chdir(BACKEND_DIR)
+    import app
+
+    # Resume: anything already in the store is done (degraded answers are never stored, so they are retried)
+    if args.force:
+        pending = locations
+    else:
+        pending = [location for location in locations if not app.GEO_CACHE.get('offsets', location)[0]]
+    print(f"{len(locations)} locations, {len(locations) - len(pending)} already stored, {len(pending)} to resolve")
+
+    def resolve(location):
+        result = app.resolve_location(location, use_store=False)
+        offsets = dict(zip(app.OFFSET_FIELDS, result[:6]))
+        if args.server:
+            warm_chunks(args.server, offsets, args.seed, args.size, args.radius)
+        return offsets, result[6].get('fallbacks', [])
+
+    start = time.time()
+    stored = degraded = failed = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers))
+    try:
+        futures = {pool.submit(resolve, location): location for location in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            location = futures[future]
+            try:
+                offsets, fallbacks = future.result()
+            except Exception as e:
+                failed += 1
+                status = f"error: {e}"
+            else:
+                if fallbacks:
+                    degraded += 1
+                    status = f"degraded ({', '.join(fallbacks)}), not stored"
+                else:
+                    stored += 1
+                    status = f"{offsets['crust_type']}, {offsets['cover_variant']}"
+            rate = done / max(time.time() - start, 1e-9)
+            print(f"[{done}/{len(pending)}] {location}: {status} ({rate:.2f}/s)", flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    print(f"Stored {stored}, degraded {degraded}, failed {failed} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()